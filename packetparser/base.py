@@ -15,20 +15,76 @@
 #
 
 class PacketContainer(object):
-    def __init__(self, data, upper_layer=None, lower_layer=None):
-        self.data = data
-        self.upper_layer = upper_layer
-        self.lower_layer = lower_layer
+    """
+    The values of a packet are looked up as attributes: first in the dict
+    data, then in the unpacked structures in order. The structures are
+    kept as they are, so their values aren't copied (and thereby
+    converted) for every packet.
+    """
+
+    def __init__(self, data, upper_layer=None, lower_layer=None, structures=()):
+        # Bypass __setattr__, none of these are keys of the packet.
+        self.__dict__.update({
+            '_fields': data,
+            '_structures': structures,
+            'upper_layer': upper_layer,
+            'lower_layer': lower_layer,
+        })
+
+    @property
+    def data(self):
+        """
+        A dict with the values of the packet. It's only created on first
+        access, after which it replaces the structures.
+        """
+
+        fields = self.__dict__.get('_fields')
+        structures = self.__dict__.get('_structures')
+
+        if not structures:
+            return fields
+
+        merged = {}
+
+        for structure in reversed(structures):
+            for key in structure._key_set:
+                merged[key] = getattr(structure, key)
+
+        if fields:
+            merged.update(fields)
+
+        self.__dict__['_fields'] = merged
+        self.__dict__['_structures'] = ()
+
+        return merged
+
+    @data.setter
+    def data(self, data):
+        self.__dict__['_fields'] = data
+        self.__dict__['_structures'] = ()
 
     def __getattr__(self, name, *args, **kwargs):
-        if 'data' in self.__dict__ and name in self.__dict__['data']:
-            return self.__dict__['data'][name]
+        fields = self.__dict__.get('_fields')
+
+        if fields is not None and name in fields:
+            return fields[name]
 
-        raise AttributeError()
+        for structure in self.__dict__.get('_structures', ()):
+            if name in structure._key_set:
+                return getattr(structure, name)
+
+        raise AttributeError(name)
 
     def __setattr__(self, name, value, *args, **kwargs):
-        if 'data' in self.__dict__ and name in self.__dict__['data']:
-            self.__dict__['data'][name] = value
+        fields = self.__dict__.get('_fields')
+
+        if fields is not None and name in fields:
+            fields[name] = value
+        else:
+            for structure in self.__dict__.get('_structures', ()):
+                if name in structure._key_set:
+                    setattr(structure, name, value)
+                    break
 
         super(PacketContainer, self).__setattr__(name, value, *args, **kwargs)
 
@@ -36,5 +92,11 @@ class PacketContainer(object):
 #   XXX: implement
 
     @classmethod
-    def parse(cls, buf, extra=None):
+    def parse(cls, buf, extra=None, offset=0, end=None):
+        """
+        Parse the packet in buf which starts at offset and ends at end
+        (or the end of buf). Implementations unpack the data in place
+        instead of slicing buf.
+        """
+
         raise NotImplementedError()
@@ -0,0 +1,156 @@
+#
+# Copyright (c) 2015 Alexander Schrijver <alex@flupzor.nl>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+#
+
+"""
+Dropping the duplicate frames which are captured when the channels of
+several monitor interfaces overlap.
+"""
+
+from collections import OrderedDict
+from datetime import timedelta
+import hashlib
+import struct
+
+from .link_types import LINKTYPE_IEEE802_11_RADIOTAP, payload_type_for, radio_header_length
+from .radiotap import RadiotapFrame
+from .pcap import datetime_to_timestamp
+from .utils import buffer_slice
+
+
+class DuplicateFilter(object):
+    """
+    Remembers a hash of every frame for window (a timedelta) and reports
+    the frames seen before within that window as duplicates.
+
+    The hashes are kept in insertion order and expire from the oldest
+    end, at most max_entries are kept, so memory use is bounded. Frames
+    are expected to be in (roughly) chronological order.
+
+    With skip_radiotap the radio header (radiotap, AVS or PPI), of the
+    frames which have one, is left out of the hash, so copies captured by
+    different interfaces are recognized. With skip_fcs the last four
+    bytes are left out: True always, None when the radiotap flags say the
+    frame includes the FCS.
+    """
+
+    def __init__(self, window=timedelta(seconds=1), max_entries=1 << 20,
+                 skip_radiotap=True, skip_fcs=None):
+        self.window = int(window.total_seconds() * 1000000)
+        self.max_entries = max_entries
+        self.skip_radiotap = skip_radiotap
+        self.skip_fcs = skip_fcs
+
+        self.seen = OrderedDict()
+        self.duplicates = 0
+
+    def is_duplicate(self, timestamp, payload, includes_fcs=False,
+                     payload_type=RadiotapFrame):
+        """
+        Whether the pcap payload recorded at timestamp, in microseconds,
+        was seen within the window. payload_type is the payload parser of
+        the link type of the capture (see link_types.py), which tells
+        whether the payload starts with a radio header.
+        """
+
+        start = 0
+        length = len(payload)
+
+        if self.skip_radiotap:
+            try:
+                start = min(radio_header_length(payload_type, payload), length)
+            except struct.error:
+                # Too short to have the header, hash all of it.
+                start = 0
+
+            length -= start
+
+        if self.skip_fcs or (self.skip_fcs is None and includes_fcs):
+            length -= 4
+
+        digest = hashlib.sha1(buffer_slice(payload, start, max(length, 0))).digest()
+
+        seen = self.seen
+        window = self.window
+
+        # Expire the hashes which fell out of the window.
+        while seen:
+            oldest = next(iter(seen))
+
+            if timestamp - seen[oldest] <= window:
+                break
+
+            del seen[oldest]
+
+        seen_at = seen.get(digest)
+
+        if seen_at is not None and timestamp - seen_at <= window:
+            self.duplicates += 1
+            return True
+
+        # Out of order frames can leave a hash of another window behind.
+        seen.pop(digest, None)
+
+        if len(seen) >= self.max_entries:
+            seen.popitem(last=False)
+
+        seen[digest] = timestamp
+
+        return False
+
+    def frames(self, frames):
+        """
+        Drop the duplicates from an iterable of PcapFrames, which have to
+        have a payload (see the depth argument of PcapFile.frames).
+        """
+
+        for frame in frames:
+            ts_sec, ts_usec = datetime_to_timestamp(frame.time_recorded)
+
+            includes_fcs = False
+            radiotap_frame = getattr(frame, 'radiotap_frame', None)
+
+            if radiotap_frame is not None:
+                includes_fcs = getattr(radiotap_frame, 'with_includes_fcs', False)
+
+            timestamp = ts_sec * 1000000 + ts_usec
+
+            if not self.is_duplicate(timestamp, frame.payload, includes_fcs,
+                                     frame.payload_type):
+                yield frame
+
+    def records(self, records, network=LINKTYPE_IEEE802_11_RADIOTAP):
+        """
+        Drop the duplicates from an iterable of (PcapRecordHeader, payload)
+        tuples, see PcapFile.records, of a capture with link type network.
+        The FCS is only left out with skip_fcs set to True.
+        """
+
+        payload_type = payload_type_for(network)
+
+        for header, payload in records:
+            timestamp = header.ts_sec * 1000000 + header.ts_usec
+
+            if not self.is_duplicate(timestamp, payload, payload_type=payload_type):
+                yield header, payload
+
+
+def dedup_frames(frames, **kwargs):
+    """
+    Drop the duplicate frames from frames, kwargs are the arguments of
+    DuplicateFilter.
+    """
+
+    return DuplicateFilter(**kwargs).frames(frames)
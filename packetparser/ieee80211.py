@@ -37,83 +37,89 @@ from .ieee80211_types import (
 from .ieee80211_structures import (
     IEEE80211MinimalFrameStructure, IEEE80211FrameStructure
 )
+from .utils import unpack_bytes, unpack_octets
 
 
 class IEEE80211Frame(PacketContainer):
     name='ieee80211_frame'
 
     @classmethod
-    def process_element(cls, buf):
-        element = IEEE80211Element.unpack(buf)
+    def process_element(cls, buf, offset=0, end=None):
+        if end is None:
+            end = len(buf)
 
-        i = element.struct.size
+        # An element header cut off at the end, nothing more to parse.
+        if offset + IEEE80211Element.struct.size > end:
+            return {}, end - offset
+
+        element = IEEE80211Element.unpack(buf, offset)
+
+        i = offset + element.struct.size
+
+        # The number of octets of the element which are in the buffer.
+        length = max(min(element.length, end - i), 0)
 
         data = {}
         if element.element_id == element.ELEMENT_SSID:
             # 802.11-2012 8.4.2.2
 
-            ssid = buf[i:i+element.length]
             data.update({
-                'ssid': ssid.tostring(),
+                'ssid': unpack_bytes(buf, i, length),
                 'ssid_invalid_length': element.length > 32  # SSIDs can be at most 32 octets
             })
         elif element.element_id == element.ELEMENT_SUPPORTED_RATES:
             # 8.4.2.3
             # TODO: The (HT PHY) membership selector is not implemented.
 
-            supported_rates_buf = buf[i:i+element.length]
+            supported_rates = unpack_octets(buf, i, length)
 
-            j = 0
             mandatory_rates = []
             optional_rates = []
-            while j < len(supported_rates_buf):
+            for rate in supported_rates:
 
-                if supported_rates_buf[j] & 0x80 == 0x80:
-                    rate_in_500kbps = supported_rates_buf[j] & 0x7f
+                if rate & 0x80 == 0x80:
+                    rate_in_500kbps = rate & 0x7f
                     rate_in_mbps = rate_in_500kbps / 2.0
                     mandatory_rates.append(rate_in_mbps)
                 else:
-                    rate_in_500kbps = supported_rates_buf[j]
+                    rate_in_500kbps = rate
                     rate_in_mbps = rate_in_500kbps / 2.0
                     optional_rates.append(rate_in_mbps)
 
-                j += 1
-
             data.update({
                 'supported_rates_mandatory': mandatory_rates,
                 'supported_rates_optional': optional_rates,
             })
-        elif element.element_id == element.ELEMENT_TIM:
-            tim_buf = buf[i:i+element.length]
-
-            tim_element = IEEE80211TIM.unpack(tim_buf)
+        elif element.element_id == element.ELEMENT_TIM and length >= IEEE80211TIM.struct.size:
+            tim_element = IEEE80211TIM.unpack(buf, i)
+            tim_size = tim_element.struct.size
 
             data.update({
                 'dtim_count': tim_element.dtim_count,
                 'dtim_period': tim_element.dtim_period,
                 'dtim_multicast_buffered': bool(tim_element.bitmap_control & 0x80),
                 'dtim_bitmap_offset': tim_element.bitmap_control & 0x7f,
-                'dtim_bitmap': tim_buf[tim_element.struct.size:].tolist()
+                'dtim_bitmap': list(unpack_octets(buf, i + tim_size, max(length - tim_size, 0)))
             })
 
             # TODO: The virtual bitmap isn't processed yet.
 
-        elif element.element_id == element.ELEMENT_DSSS_PARAMETER_SET:
+        elif element.element_id == element.ELEMENT_DSSS_PARAMETER_SET and length >= 1:
             # TODO: If the element length is not equal to 1 there
             # is extra data we might be interested in.
             data.update({
                 'dsss_invalid_length': element.length != 1,
-                'dsss_current_channel': buf[i],
+                'dsss_current_channel': unpack_octets(buf, i, 1)[0],
             })
         elif element.element_id == element.ELEMENT_COUNTRY:
             # TODO: This needs a lot more work.
             data.update({
-                'country_string': buf[i:i+3].tostring()
+                'country_string': unpack_bytes(buf, i, min(length, 3))
             })
 
-        i+= element.length
+        i += element.length
 
-        return data, i
+        return data, i - offset
 
 
 class IEEE80211ManagementFrame(IEEE80211Frame):
@@ -130,10 +136,13 @@ class IEEE80211ControlFrame(IEEE80211Frame):
 
 class IEEE80211NotSupported(IEEE80211Frame):
     @classmethod
-    def parse(cls, buf, extra=None):
-        frame_struct = IEEE80211MinimalFrameStructure.unpack(buf)
+    def parse(cls, buf, extra=None, offset=0, end=None):
+        if end is None:
+            end = len(buf)
 
-        frame = cls(frame_struct.data)
+        frame_struct = IEEE80211MinimalFrameStructure.unpack_within(buf, offset, end)
+
+        frame = cls(None, structures=(frame_struct, ))
 
         return frame
 
@@ -144,44 +153,50 @@ class IEEE80211BeaconFrame(IEEE80211ManagementFrame):
     """
 
     @classmethod
-    def process_beacon_frame(cls, buf):
+    def process_beacon_frame(cls, buf, offset=0, end=None):
+        """
+        Returns a dict with the data of the elements and a tuple with the
+        structures of the fixed fields.
+        """
+
+        if end is None:
+            end = len(buf)
 
-        i = 0
+        i = offset
         data = {}
 
-        timestamp_struct = IEEE80211TimestampField.unpack(buf)
+        timestamp_struct = IEEE80211TimestampField.unpack_within(buf, i, end)
         i += timestamp_struct.struct.size
-        data.update(timestamp_struct.data)
 
-        beacon_interval_struct = IEEE80211BeaconIntervalField.unpack(buf[i:])
+        beacon_interval_struct = IEEE80211BeaconIntervalField.unpack_within(buf, i, end)
         i += beacon_interval_struct.struct.size
-        data.update(beacon_interval_struct.data)
 
-        capability_info_struct = IEEE80211CapabilityInformationField.unpack(buf[i:])
+        capability_info_struct = IEEE80211CapabilityInformationField.unpack_within(buf, i, end)
         i += capability_info_struct.struct.size
-        data.update(capability_info_struct.data)
 
-        while i < len(buf):
-            element_data, octets_processed = cls.process_element(buf[i:])
+        while i < end:
+            element_data, octets_processed = cls.process_element(buf, i, end)
             i += octets_processed
             data.update(element_data)
 
-        return data
+        return data, (
+            timestamp_struct,
+            beacon_interval_struct,
+            capability_info_struct
+        )
 
     @classmethod
-    def parse(cls, buf, extra=None):
-        frame_struct = IEEE80211FrameStructure.unpack(buf)
+    def parse(cls, buf, extra=None, offset=0, end=None):
+        if end is None:
+            end = len(buf)
 
-        frame_body = buf[frame_struct.struct.size:]
+        frame_struct = IEEE80211FrameStructure.unpack_within(buf, offset, end)
 
-        data = {}
-        data.update(frame_struct.data)
-
-        data.update(
-            cls.process_beacon_frame(frame_body)
+        data, fixed_fields = cls.process_beacon_frame(
+            buf, offset + frame_struct.struct.size, end
         )
 
-        frame = cls(data)
+        frame = cls(data, structures=fixed_fields + (frame_struct, ))
 
         return frame
 
@@ -189,31 +204,30 @@ class IEEE80211BeaconFrame(IEEE80211ManagementFrame):
 class IEEE80211ProbeReq(IEEE80211ManagementFrame):
 
     @classmethod
-    def process_probe_req(cls, buf):
-        i = 0
+    def process_probe_req(cls, buf, offset=0, end=None):
+        if end is None:
+            end = len(buf)
+
+        i = offset
         data = {}
 
-        while i < len(buf):
-            element_data, octets_processed = cls.process_element(buf[i:])
+        while i < end:
+            element_data, octets_processed = cls.process_element(buf, i, end)
             i += octets_processed
             data.update(element_data)
 
         return data
 
     @classmethod
-    def parse(cls, buf, extra=None):
-        frame_struct = IEEE80211FrameStructure.unpack(buf)
-
-        frame_body = buf[frame_struct.struct.size:]
+    def parse(cls, buf, extra=None, offset=0, end=None):
+        if end is None:
+            end = len(buf)
 
-        data = {}
-        data.update(frame_struct.data)
+        frame_struct = IEEE80211FrameStructure.unpack_within(buf, offset, end)
 
-        data.update(
-            cls.process_probe_req(frame_body)
-        )
+        data = cls.process_probe_req(buf, offset + frame_struct.struct.size, end)
 
-        frame = cls(data)
+        frame = cls(data, structures=(frame_struct, ))
 
         return frame
 
@@ -234,18 +248,27 @@ ieee80211_mapping = {
 }
 
 
-def parse_ieee80211_frame(buf, extra=None):
+def parse_ieee80211_frame(buf, extra=None, offset=0, end=None):
     """
     Based on the type and subtype in the given buffer create the appropriate
     IEEE80211 class instance.
     """
 
-    frame_struct = IEEE80211MinimalFrameStructure.unpack(buf)
+    if end is None:
+        end = len(buf)
 
-    frame_type = frame_struct.data.get('type')
-    frame_subtype = frame_struct.data.get('subtype')
+    frame_struct = IEEE80211MinimalFrameStructure.unpack_within(buf, offset, end)
+
+    frame_type = frame_struct.type
+    frame_subtype = frame_struct.subtype
 
     cls = ieee80211_mapping.get((frame_type, frame_subtype)) or IEEE80211NotSupported
 
-    return cls.parse(buf, extra)
+    if extra and extra.get('depth') == 'ieee80211_header' and cls is not IEEE80211NotSupported:
+        # Only the header, not the fixed fields and elements of the body.
+        return cls(None, structures=(
+            IEEE80211FrameStructure.unpack_within(buf, offset, end),
+        ))
+
+    return cls.parse(buf, extra, offset, end)
 
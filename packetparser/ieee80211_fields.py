@@ -21,7 +21,15 @@
 """
 
 from datetime import timedelta
-from .types import Structure, UInt8, UInt16, UInt64, Array, LittleEndian
+from .types import Structure, UInt8, UInt16, UInt64, LittleEndian, Computed, Flags
+
+
+def tu_to_timedelta(tu):
+    # Convert from TU (Time Units) to microseconds.
+    # 1 TU = 1024 microseconds
+
+    return timedelta(microseconds=tu * 1024)
+
 
 class IEEE80211TimestampField(Structure):
     """
@@ -48,14 +56,10 @@ class IEEE80211BeaconIntervalField(Structure):
         ('beacon_interval', UInt16),
     )
 
-    @classmethod
-    def to_python(cls, data):
-        # Convert from TU (Time Units) to microseconds.
-        # 1 TU = 1024 microseconds
-
-        return {
-            'beacon_interval': timedelta(microseconds=data.get('beacon_interval') * 1024)
-        }
+    lazy = True
+    python_attribute_list = (
+        ('beacon_interval', Computed(tu_to_timedelta, 'beacon_interval')),
+    )
 
 
 class IEEE80211CapabilityInformationField(Structure):
@@ -65,11 +69,6 @@ class IEEE80211CapabilityInformationField(Structure):
     802.11-2014 8.4.1.4
     """
 
-    endianness = LittleEndian
-    attribute_list = (
-        ('capability', Array(UInt8, 2)),
-    )
-
     CAP0_ESS = 0x01 << 0
     CAP0_IBSS = 0x01 << 1
     CAP0_CF_POLLABLE = 0x01 << 2
@@ -82,25 +81,23 @@ class IEEE80211CapabilityInformationField(Structure):
     CAP1_DSSS_OFDM = 0x01 << 5
     CAP1_SHORT_SLOT_TIME = 0x01 << 2
 
-    @classmethod
-    def to_python(cls, data):
-        def field_is_set(data, mask):
-            return data & mask == mask
-
-        cap = data.get('capability')
-
-        # TODO: Deal with the CF_POLLABLE, CF_POLL_REQ and QoS fields and
-        # the translation table in 802.11-2014 8.4.1.4
+    # TODO: Deal with the CF_POLLABLE, CF_POLL_REQ and QoS fields and
+    # the translation table in 802.11-2014 8.4.1.4
 
-        return {
-            "capability_ess": field_is_set(cap[0], cls.CAP0_ESS),
-            "capability_ibss": field_is_set(cap[0], cls.CAP0_IBSS),
-            "capability_privacy": field_is_set(cap[0], cls.CAP0_PRIVACY),
-            "capability_short_preamble": field_is_set(cap[0], cls.CAP0_SHORT_PREAMBLE),
-            "capability_pbcc": field_is_set(cap[0], cls.CAP0_PBCC),
-            "capability_channel_agility": field_is_set(cap[0], cls.CAP0_CHANNEL_AGILITY),
-            "capability_short_slot_time": field_is_set(cap[1], cls.CAP1_SHORT_SLOT_TIME),
-            "capability_dss_ofdm": field_is_set(cap[1], cls.CAP1_DSSS_OFDM),
-        }
+    endianness = LittleEndian
+    attribute_list = (
+        ('capability0', Flags(UInt8, (
+            ("capability_ess", CAP0_ESS),
+            ("capability_ibss", CAP0_IBSS),
+            ("capability_privacy", CAP0_PRIVACY),
+            ("capability_short_preamble", CAP0_SHORT_PREAMBLE),
+            ("capability_pbcc", CAP0_PBCC),
+            ("capability_channel_agility", CAP0_CHANNEL_AGILITY),
+        ))),
+        ('capability1', Flags(UInt8, (
+            ("capability_short_slot_time", CAP1_SHORT_SLOT_TIME),
+            ("capability_dss_ofdm", CAP1_DSSS_OFDM),
+        ))),
+    )
 
-        return data
+    lazy = True
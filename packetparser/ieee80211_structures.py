@@ -14,18 +14,13 @@
 # OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
 #
 
-from .types import Structure, UInt8, UInt16, Array, LittleEndian
+from .types import Structure, UInt8, UInt16, Array, LittleEndian, BitField
 
 class IEEE80211MinimalFrameStructure(Structure):
     """
     A minimal 802.11 Frame to determine the type and subtype.
     """
 
-    endianness = LittleEndian
-    attribute_list = (
-        ('i_fc', Array(UInt8, 2)),
-    )
-
     # 80211-2012 8.2.4.1.1
     FC0_VERSION_MASK = 0x03 << 0
     FC0_TYPE_MASK = 0x03 << 2
@@ -33,27 +28,21 @@ class IEEE80211MinimalFrameStructure(Structure):
     FC1_TODS_MASK = 0x01 << 1
     FC1_FROMDS_MASK = 0x01 << 2
 
-    @classmethod
-    def parse_fc(cls, data):
-        fc = data.get('i_fc')
-
-        i_version = fc[0] & cls.FC0_VERSION_MASK
-        i_type = fc[0] & cls.FC0_TYPE_MASK
-        i_subtype = fc[0] & cls.FC0_SUBTYPE_MASK
-        i_tods = fc[1] & cls.FC1_TODS_MASK
-        i_fromds = fc[1] & cls.FC1_FROMDS_MASK
-
-        return {
-            'version': i_version,
-            'type': i_type,
-            'subtype': i_subtype,
-            'tods': i_tods,
-            'fromds': i_fromds,
-        }
+    FC0 = BitField(UInt8, (
+        ('version', FC0_VERSION_MASK),
+        ('type', FC0_TYPE_MASK),
+        ('subtype', FC0_SUBTYPE_MASK),
+    ))
+    FC1 = BitField(UInt8, (
+        ('tods', FC1_TODS_MASK),
+        ('fromds', FC1_FROMDS_MASK),
+    ))
 
-    @classmethod
-    def to_python(cls, data):
-        return cls.parse_fc(data)
+    endianness = LittleEndian
+    attribute_list = (
+        ('i_fc0', FC0),
+        ('i_fc1', FC1),
+    )
 
 
 class IEEE80211FrameStructure(IEEE80211MinimalFrameStructure):
@@ -62,7 +51,8 @@ class IEEE80211FrameStructure(IEEE80211MinimalFrameStructure):
     """
     endianness = LittleEndian
     attribute_list = (
-        ('i_fc', Array(UInt8, 2)),
+        ('i_fc0', IEEE80211MinimalFrameStructure.FC0),
+        ('i_fc1', IEEE80211MinimalFrameStructure.FC1),
         ('i_dur', Array(UInt8, 2)),
 
         ('i_addr1', Array(UInt8, 6)),
@@ -72,24 +62,9 @@ class IEEE80211FrameStructure(IEEE80211MinimalFrameStructure):
         ('i_seq', UInt16),
     )
 
-    @classmethod
-    def to_python(cls, data):
-        fc = data.get('i_fc')
-
-        i_version = fc[0] & cls.FC0_VERSION_MASK
-        i_type = fc[0] & cls.FC0_TYPE_MASK
-        i_subtype = fc[0] & cls.FC0_SUBTYPE_MASK
-        i_tods = fc[1] & cls.FC1_TODS_MASK
-        i_fromds = fc[1] & cls.FC1_FROMDS_MASK
-
-        return {
-            'version': i_version,
-            'type': i_type,
-            'subtype': i_subtype,
-            'tods': i_tods,
-            'fromds': i_fromds,
-            'addr1': data.get('i_addr1'),
-            'addr2': data.get('i_addr2'),
-            'addr3': data.get('i_addr3'),
-            'seq': data.get('i_seq'),
-        }
+    python_attribute_list = (
+        ('addr1', 'i_addr1'),
+        ('addr2', 'i_addr2'),
+        ('addr3', 'i_addr3'),
+        ('seq', 'i_seq'),
+    )
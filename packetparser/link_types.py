@@ -0,0 +1,199 @@
+#
+# Copyright (c) 2015 Alexander Schrijver <alex@flupzor.nl>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+#
+
+"""
+The parsers of the payloads of the link types found in captures. The
+payload parser of a capture is looked up once per file, with
+payload_type_for.
+
+A payload parser is a class with a name, the attribute of the PcapFrame
+the parsed payload is stored in, and a parse classmethod (see
+PacketContainer.parse). Link types without a parser are passed through:
+only the payload attribute of the PcapFrame is set.
+"""
+
+from .base import PacketContainer
+from .ieee80211 import parse_ieee80211_frame
+from .radiotap import RadiotapFrame
+from .types import Structure, BigEndian, LittleEndian, Int32, UInt8, UInt16, UInt32, UInt64
+
+
+LINKTYPE_IEEE802_11 = 105
+LINKTYPE_IEEE802_11_RADIOTAP = 127
+LINKTYPE_IEEE802_11_AVS = 163
+LINKTYPE_PPI = 192
+
+
+class IEEE80211Payload(object):
+    """
+    Raw IEEE 802.11 frames, without a radio header.
+    """
+    name = 'ieee80211_frame'
+
+    @classmethod
+    def parse(cls, buf, extra=None, offset=0, end=None):
+        if extra and extra.get('depth') == 'radiotap':
+            # There is no radio header to stop at.
+            return None
+
+        return parse_ieee80211_frame(buf, extra, offset, end)
+
+
+class AvsFrameStructure(Structure):
+    endianness = BigEndian
+
+    attribute_list = (
+        ('version', UInt32),
+        ('length', UInt32),
+        ('mactime', UInt64),
+        ('hosttime', UInt64),
+        ('phytype', UInt32),
+        ('channel', UInt32),
+        ('datarate', UInt32),
+        ('antenna', UInt32),
+        ('priority', UInt32),
+        ('ssi_type', UInt32),
+        ('ssi_signal', Int32),
+        ('ssi_noise', Int32),
+        ('preamble', UInt32),
+        ('encoding', UInt32),
+    )
+
+
+class AvsFrame(PacketContainer):
+    """
+    The AVS capture header, followed by an IEEE 802.11 frame.
+    """
+    name = 'avs_frame'
+
+    @classmethod
+    def radio_header_length(cls, buf, offset=0):
+        """
+        The length of the AVS header at offset.
+        """
+
+        return AvsFrameStructure.struct.unpack_from(buf, offset)[1]
+
+    @classmethod
+    def parse(cls, buf, extra=None, offset=0, end=None):
+        if end is None:
+            end = len(buf)
+
+        frame_struct = AvsFrameStructure.unpack_within(buf, offset, end)
+
+        assert offset + frame_struct.length <= end
+
+        frame = cls(None, structures=(frame_struct, ))
+
+        frame.ieee80211_frame = IEEE80211Payload.parse(
+            buf,
+            {'upper_layer': frame, 'depth': extra.get('depth', 'full') if extra else 'full'},
+            offset + frame_struct.length,
+            end
+        )
+
+        return frame
+
+
+class PpiFrameStructure(Structure):
+    endianness = LittleEndian
+
+    attribute_list = (
+        ('version', UInt8),
+        ('flags', UInt8),
+        ('length', UInt16),
+        ('dlt', UInt32),
+    )
+
+
+class PpiFrame(PacketContainer):
+    """
+    The Per-Packet Information header, followed by a frame of the link
+    type in its dlt field. The fields of the header aren't parsed.
+    """
+    name = 'ppi_frame'
+
+    @classmethod
+    def radio_header_length(cls, buf, offset=0):
+        """
+        The length of the PPI header at offset.
+        """
+
+        return PpiFrameStructure.struct.unpack_from(buf, offset)[2]
+
+    @classmethod
+    def parse(cls, buf, extra=None, offset=0, end=None):
+        if end is None:
+            end = len(buf)
+
+        frame_struct = PpiFrameStructure.unpack_within(buf, offset, end)
+
+        assert offset + frame_struct.length <= end
+
+        frame = cls(None, structures=(frame_struct, ))
+        payload_type = payload_type_for(frame_struct.dlt)
+
+        if payload_type is not None:
+            payload = payload_type.parse(
+                buf,
+                {'upper_layer': frame, 'depth': extra.get('depth', 'full') if extra else 'full'},
+                offset + frame_struct.length,
+                end
+            )
+
+            setattr(frame, payload_type.name, payload)
+
+        return frame
+
+
+link_types = {
+    LINKTYPE_IEEE802_11: IEEE80211Payload,
+    LINKTYPE_IEEE802_11_RADIOTAP: RadiotapFrame,
+    LINKTYPE_IEEE802_11_AVS: AvsFrame,
+    LINKTYPE_PPI: PpiFrame,
+}
+
+
+def register_link_type(link_type, payload_type):
+    """
+    Parse the payloads of link_type with payload_type, or pass them
+    through if it's None.
+    """
+
+    link_types[link_type] = payload_type
+
+
+def payload_type_for(link_type):
+    """
+    The payload parser of link_type, None to pass the payload through.
+    """
+
+    return link_types.get(link_type)
+
+
+def radio_header_length(payload_type, buf, offset=0):
+    """
+    The length of the radio header (radiotap, AVS or PPI) at offset of a
+    payload parsed by payload_type, 0 if it has none. Payload parsers
+    with a radio header have a radio_header_length classmethod.
+    """
+
+    header_length = getattr(payload_type, 'radio_header_length', None)
+
+    if header_length is None:
+        return 0
+
+    return header_length(buf, offset)
@@ -0,0 +1,156 @@
+#
+# Copyright (c) 2015 Alexander Schrijver <alex@flupzor.nl>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+#
+
+"""
+Merging captures of the same site by several sensors into one stream of
+frames in the order in which they were recorded.
+"""
+
+import heapq
+import itertools
+
+from .pcap import PcapFile, PcapWriter
+
+
+def _clock_offsets(paths, clock_offsets):
+    """
+    The clock offset (a timedelta) of every path. clock_offsets is either
+    a sequence in the order of paths or a dict by path, missing offsets are
+    zero.
+    """
+
+    if clock_offsets is None:
+        return [None] * len(paths)
+
+    if isinstance(clock_offsets, dict):
+        return [clock_offsets.get(path) for path in paths]
+
+    clock_offsets = list(clock_offsets)
+
+    return clock_offsets + [None] * (len(paths) - len(clock_offsets))
+
+
+def _microseconds(delta):
+    if delta is None:
+        return 0
+
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def _open(paths):
+    pcap_files = []
+
+    try:
+        for path in paths:
+            pcap_files.append(PcapFile.open(path))
+    except Exception:
+        for pcap_file in pcap_files:
+            pcap_file.close()
+        raise
+
+    return pcap_files
+
+
+def merge_captures(paths, clock_offsets=None, depth='full'):
+    """
+    Iterate over the frames of the captures at paths in the order in which
+    they were recorded. The clock offset of a capture is added to the
+    time_recorded of its frames, the capture attribute of a frame is the
+    index of its path. Every capture has to be in chronological order,
+    only one frame per capture is held at the time.
+    """
+
+    pcap_files = _open(paths)
+    counter = itertools.count()
+
+    def keyed(index, pcap_file, offset):
+        for frame in pcap_file.frames(depth=depth):
+            if offset:
+                frame.time_recorded = frame.time_recorded + offset
+
+            frame.capture = index
+
+            # The counter keeps the frames themselves from being compared.
+            yield frame.time_recorded, index, next(counter), frame
+
+    try:
+        iterators = [
+            keyed(index, pcap_file, offset)
+            for index, (pcap_file, offset)
+            in enumerate(zip(pcap_files, _clock_offsets(paths, clock_offsets)))
+        ]
+
+        for time_recorded, index, count, frame in heapq.merge(*iterators):
+            yield frame
+    finally:
+        for pcap_file in pcap_files:
+            pcap_file.close()
+
+
+def merge_records(pcap_files, clock_offsets=None):
+    """
+    Like merge_captures, but for the raw records of already opened
+    captures, with clock_offsets in the order of pcap_files. Yields (timestamp, index, PcapRecordHeader, payload) tuples,
+    where timestamp is the corrected time in microseconds since the epoch
+    and index is the index of the capture in pcap_files.
+    """
+
+    counter = itertools.count()
+
+    def keyed(index, pcap_file, offset):
+        for header, payload in pcap_file.records():
+            timestamp = header.ts_sec * 1000000 + header.ts_usec + offset
+
+            yield timestamp, index, next(counter), header, payload
+
+    iterators = [
+        keyed(index, pcap_file, _microseconds(offset))
+        for index, (pcap_file, offset)
+        in enumerate(zip(pcap_files, _clock_offsets(pcap_files, clock_offsets)))
+    ]
+
+    for timestamp, index, count, header, payload in heapq.merge(*iterators):
+        yield timestamp, index, header, payload
+
+
+def write_merged_capture(paths, path, clock_offsets=None, **kwargs):
+    """
+    Merge the captures at paths (see merge_captures) into a new capture
+    at path. The records are copied without parsing them. The captures
+    need to have the same link type. kwargs are passed on to PcapWriter.
+    """
+
+    pcap_files = _open(paths)
+
+    try:
+        networks = set(pcap_file.network for pcap_file in pcap_files)
+
+        if len(networks) > 1:
+            raise ValueError("The captures have different link types")
+
+        if pcap_files:
+            kwargs.setdefault('network', networks.pop())
+            kwargs.setdefault('snaplen', max(pcap_file.snaplen for pcap_file in pcap_files))
+
+        offsets = _clock_offsets(paths, clock_offsets)
+
+        with PcapWriter.open(path, **kwargs) as writer:
+            for timestamp, index, header, payload in merge_records(pcap_files, offsets):
+                ts_sec, ts_usec = divmod(timestamp, 1000000)
+                writer.write_record(ts_sec, ts_usec, payload, header.orig_len)
+    finally:
+        for pcap_file in pcap_files:
+            pcap_file.close()
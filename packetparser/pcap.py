@@ -15,12 +15,94 @@
 #
 
 import array
+import calendar
+from collections import namedtuple
 from datetime import datetime, timedelta
+from functools import reduce
+import io
+import mmap
+import multiprocessing
+import os
 import time
 
 from .base import PacketContainer
-from .radiotap import RadiotapFrame
-from .types import Structure, UInt32, UInt16, Int32
+from .pcap_index import PcapIndex
+from .link_types import payload_type_for
+from .sampling import Reservoir
+from .readers import BlockReader, BufferReader, DEFAULT_BLOCK_SIZE, open_decompressed
+from .types import Structure, UInt32, UInt16, Int32, Computed
+from .utils import buffer_slice
+
+
+# How far frames are parsed: only the PCAP record header, up to and
+# including the radiotap header, up to the IEEE 802.11 header or
+# everything.
+DEPTHS = ('pcap', 'radiotap', 'ieee80211_header', 'full')
+
+
+# The raw fields of a PCAP record header, see PcapFile.frames.
+PcapRecordHeader = namedtuple('PcapRecordHeader', ('ts_sec', 'ts_usec', 'incl_len', 'orig_len'))
+
+# The block type of the section header which starts a pcapng file.
+PCAPNG_MAGIC = b'\x0a\x0d\x0d\x0a'
+
+
+def check_depth(depth):
+    """
+    Raise a ValueError if depth isn't one of DEPTHS.
+    """
+
+    if depth not in DEPTHS:
+        raise ValueError("Unknown depth {0}".format(depth))
+
+
+def select_records(records, start=None, end=None, where=None, sample=None, keep=None):
+    """
+    The items of an iterable of (PcapRecordHeader, item) tuples which are
+    selected by the start, end, where and sample arguments of
+    PcapFile.frames. keep is called for the items chosen by a Reservoir
+    sample, see Reservoir.select.
+    """
+
+    start_key = datetime_to_timestamp(start) if start is not None else None
+    end_key = datetime_to_timestamp(end) if end is not None else None
+
+    if sample is not None and not isinstance(sample, Reservoir):
+        where = _both(where, sample.predicate())
+
+    def matching():
+        for header, item in records:
+            if end_key is not None and header[:2] > end_key:
+                return
+
+            if start_key is not None and header[:2] < start_key:
+                continue
+
+            if where is not None and not where(header):
+                continue
+
+            yield item
+
+    if isinstance(sample, Reservoir):
+        return iter(sample.select(matching(), keep))
+
+    return matching()
+
+
+def timestamp_to_datetime(ts_sec, ts_usec):
+    if ts_usec >= 1000000:
+        raise ValueError("ts_usec shouldn't be equal to or larger than 1 000 000 microseconds")
+
+    return datetime.utcfromtimestamp(ts_sec) + timedelta(microseconds=ts_usec)
+
+
+def datetime_to_timestamp(value):
+    """
+    The (ts_sec, ts_usec) pair of a datetime, the inverse of
+    timestamp_to_datetime. Naive datetimes are taken to be UTC.
+    """
+
+    return calendar.timegm(value.utctimetuple()), value.microsecond
 
 
 class PcapFrameStructure(Structure):
@@ -31,6 +113,13 @@ class PcapFrameStructure(Structure):
         ('orig_len', UInt32),
     )
 
+    lazy = True
+    python_attribute_list = (
+        ('time_recorded', Computed(timestamp_to_datetime, 'ts_sec', 'ts_usec')),
+        ('len', 'incl_len'),
+        ('orig_len', 'orig_len'),
+    )
+
     @classmethod
     def defaults(cls):
         """
@@ -66,29 +155,6 @@ class PcapFrameStructure(Structure):
             'orig_len': data.get('orig_len'),
         }
 
-    @classmethod
-    def to_python(cls, data):
-        """
-        Convert from the Structure specific data to human readable data.
-        """
-
-        if data['ts_usec'] >= 1000000:
-            raise ValueError("ts_usec shouldn't be equal to or larger than 1 000 000 microseconds")
-
-        timestamp = data['ts_sec']
-        ms_offset = data['ts_usec']
-
-        time_recorded = datetime.utcfromtimestamp(timestamp) + timedelta(microseconds=ms_offset)
-
-        new = cls.defaults()
-        new.update({
-            'time_recorded': time_recorded,
-            'len': data['incl_len'],
-            'orig_len': data['orig_len'],
-        })
-
-        return new
-
 
 class PcapFrame(PacketContainer):
     """
@@ -97,6 +163,10 @@ class PcapFrame(PacketContainer):
     """
     name = 'pcap_frame'
 
+    # The depth (see DEPTHS) the frame was read at, only frames which
+    # weren't read in full have it as an attribute of their own.
+    depth = 'full'
+
     @classmethod
     def parse(cls, file_handle, extra={}):
 
@@ -116,12 +186,16 @@ class PcapFrame(PacketContainer):
         )
 
         payload_type = extra.get('payload_type')
-        payload_name = payload_type.name
-
-        data = pcap_frame_struct.data
 
         # First create the frame
-        frame = cls(data)
+        frame = cls(None, structures=(pcap_frame_struct, ))
+        frame.payload = pcap_payload_array
+        frame.payload_type = payload_type
+
+        if payload_type is None:
+            return frame
+
+        payload_name = payload_type.name
 
         extra = {
             'upper_layer': frame
@@ -137,8 +211,99 @@ class PcapFrame(PacketContainer):
 
         return frame
 
+    @classmethod
+    def read(cls, reader, extra={}):
+        """
+        Like parse, but unpacks the frame in place in the buffer handed
+        out by reader (see readers.py). The payload attribute is a view on
+        the payload in that buffer.
+
+        At the 'pcap' depth (see DEPTHS) the payload is skipped, the
+        payload attribute is None.
+        """
+
+        buf, offset = reader.read(PcapFrameStructure.struct.size)
+        pcap_frame_struct = PcapFrameStructure.unpack(buf, offset)
+
+        length = pcap_frame_struct.len
+        depth = extra.get('depth', 'full')
+
+        frame = cls(None, structures=(pcap_frame_struct, ))
+
+        if depth != 'full':
+            frame.depth = depth
+
+        if depth == 'pcap':
+            reader.skip(length)
+            frame.payload = None
+            frame.payload_type = None
+            return frame
+
+        buf, offset = reader.read(length)
+
+        payload_type = extra.get('payload_type')
+
+        frame.payload = buffer_slice(buf, offset, length)
+        frame.payload_type = payload_type
+
+        # Link types without a parser are passed through.
+        if payload_type is None:
+            return frame
+
+        payload = payload_type.parse(
+            buf,
+            {'upper_layer': frame, 'depth': depth},
+            offset,
+            offset + length
+        )
+
+        setattr(frame, payload_type.name, payload)
+
+        return frame
+
+    def copy(self):
+        """
+        A copy of a frame created by read, with its own copy of the
+        payload which is parsed to the same depth. Frames read with a
+        BlockReader have to be copied to keep them after the reader moved
+        on.
+        """
+
+        payload = None if self.payload is None else bytearray(self.payload)
+        payload_type = self.payload_type
+
+        # The copy shares the structures with this frame.
+        fields = self.__dict__['_fields']
+        frame = type(self)(
+            None if fields is None else dict(fields),
+            structures=self.__dict__['_structures']
+        )
+        frame.payload = payload
+        frame.payload_type = payload_type
+
+        if self.depth != 'full':
+            frame.depth = self.depth
+
+        if payload_type is not None:
+            setattr(frame, payload_type.name, payload_type.parse(
+                payload,
+                {'upper_layer': frame, 'depth': self.depth},
+                0,
+                len(payload)
+            ))
+
+        return frame
+
     def to_buffer(self):
-        pass
+        """
+        The PCAP record of the frame: the record header followed by the
+        payload.
+        """
+
+        buf = bytearray(PcapWriter.record_struct.size + len(self.payload))
+        PcapWriter.pack_record(buf, 0, self)
+
+        return buf
 
 
 class PcapHeaderStructure(Structure):
@@ -239,9 +404,31 @@ class PcapFile(PacketContainer):
     time
     """
 
-    def __init__(self, data, file_handle, seekable=True):
+    # When seeking without an index the bisection stops once the window is
+    # this small, the rest is walked record by record.
+    seek_window = 1 << 16
+
+    # The number of consecutive plausible record headers needed to accept
+    # an offset as a record boundary when resynchronizing.
+    resync_records = 3
+
+    # The size of the blocks in which files which aren't mapped are read.
+    block_size = DEFAULT_BLOCK_SIZE
+
+    def __init__(self, data, file_handle, seekable=True, mapping=None):
         self.file_handle = file_handle
         self.seekable = seekable
+        self.mapping = mapping
+        self.path = None
+        self.frame_index = None
+        self.writer = None
+
+        # Remember the path of regular files for the sidecar index. Other
+        # file handles have names like <stdin> or <fdopen>.
+        name = getattr(file_handle, 'name', None)
+
+        if isinstance(name, str) and os.path.isfile(name):
+            self.path = name
 
         new = {}
         new.update(PcapHeaderStructure.defaults())
@@ -286,44 +473,1156 @@ class PcapFile(PacketContainer):
         header_frame_array.tofile(self.file_handle)
         self.file_handle.flush()
 
+        self.writer = PcapWriter(
+            self.file_handle,
+            network=pcap_struct.network,
+            snaplen=pcap_struct.snaplen,
+            header=False
+        )
+
     def write_frame(self, frame):
-        pass
+        """
+        Append frame to the file, write_header has to be called first. The
+        frames are buffered until flush or close.
+        """
+
+        if self.writer is None:
+            raise Exception("The header hasn't been written")
+
+        self.writer.write_frame(frame)
+
+    def flush(self):
+        if self.writer is not None:
+            self.writer.flush()
 
     @classmethod
     def parse_header(cls, file_handle, seekable=True):
         if seekable:
             file_handle.seek(0)
 
-        header_frame_array = array.array('B')
-        header_frame_array.fromfile(
-            file_handle,
-            PcapHeaderStructure.struct.size
-        )
+        # Not fromfile, file_handle can be a decompressing file object.
+        header = file_handle.read(PcapHeaderStructure.struct.size)
+
+        if len(header) < PcapHeaderStructure.struct.size:
+            raise EOFError()
 
-        pcap_header_struct = PcapHeaderStructure.unpack(header_frame_array)
+        pcap_header_struct = PcapHeaderStructure.unpack(header)
         data = pcap_header_struct.data
 
         return cls(data, file_handle, seekable=seekable)
 
-    def frames(self):
+    @classmethod
+    def open(cls, path):
+        """
+        Open the capture at path. Uncompressed captures are mapped (see
+        open_mmap), compressed ones (see open_decompressed) are
+        decompressed while the frames are read in blocks. pcapng captures
+        are opened with PcapngFile.open.
+        """
+
+        file_handle, compressed = open_decompressed(path)
+        magic = file_handle.read(len(PCAPNG_MAGIC))
+        file_handle.close()
+
+        if magic == PCAPNG_MAGIC:
+            # pcapng imports this module.
+            from .pcapng import PcapngFile
+            return PcapngFile.open(path)
+
+        if not compressed:
+            return cls.open_mmap(path)
+
+        file_handle, compressed = open_decompressed(path)
+        pcap_file = cls.parse_header(file_handle, seekable=False)
+
+        # The path is of the compressed file, which can't be indexed.
+        pcap_file.path = None
+
+        return pcap_file
+
+    @classmethod
+    def open_mmap(cls, path):
+        """
+        Open the capture at path by mapping it into memory. The frames are
+        unpacked in place in the mapping, no bytes are copied when reading
+        them.
+        """
+
+        file_handle = open(path, 'rb')
+        mapping = mmap.mmap(file_handle.fileno(), 0, access=mmap.ACCESS_READ)
+
+        pcap_header_struct = PcapHeaderStructure.unpack(mapping)
+        data = pcap_header_struct.data
+
+        return cls(data, file_handle, mapping=mapping)
+
+    def close(self):
+        self.flush()
+
+        if self.mapping is not None:
+            self.mapping.close()
+
+        self.file_handle.close()
+
+    def frame_extra(self, depth='full'):
+        """
+        The extra argument for PcapFrame.parse and PcapFrame.read.
+        """
+
+        check_depth(depth)
+
+        return {
+            'payload_type': payload_type_for(self.network),
+            'depth': depth,
+        }
+
+    def build_index(self, index_path=None):
+        """
+        Build the frame index and save it in its sidecar file, by default
+        the path of the capture with .idx appended (see load_index).
+        Saving is skipped if the sidecar can't be written, for example in
+        a read-only directory.
+        """
+
+        index = self._build_index()
+
+        if index_path is None and self.path is not None:
+            index_path = PcapIndex.default_path(self.path)
+
+        if index_path is not None:
+            try:
+                index.save(index_path)
+            except (IOError, OSError):
+                pass
+
+        return index
+
+    def _build_index(self):
+        """
+        Build the frame index with one scan over the record headers,
+        the payloads are skipped.
+        """
+
+        self._require_seekable()
+
+        mapping = self._scan_mapping()
+
+        if mapping is not None:
+            index = self._scan_buffer(mapping)
+
+            if mapping is not self.mapping:
+                mapping.close()
+        else:
+            index = self._scan_file()
+
+        index.capture_mtime = self._capture_mtime()
+        self.frame_index = index
+
+        return index
+
+    def _scan_mapping(self):
+        """
+        The mapping of the capture. Files opened without open_mmap get a
+        temporary one, which the caller closes. None if the file can't be
+        mapped, also for streams: the file of a compressed capture holds
+        the compressed bytes.
+        """
+
+        if self.mapping is not None:
+            return self.mapping
+
+        if not self.seekable:
+            return None
+
+        try:
+            fileno = self.file_handle.fileno()
+            capture_size = os.fstat(fileno).st_size
+        except (AttributeError, IOError, OSError, ValueError):
+            return None
+
+        if capture_size == 0:
+            return None
+
+        return mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+
+    def _scan_buffer(self, buf):
+        unpack_from = PcapFrameStructure.struct.unpack_from
+        record_size = PcapFrameStructure.struct.size
+
+        index = PcapIndex(len(buf))
+        append = index.append
+
+        offset = PcapHeaderStructure.struct.size
+        end = len(buf)
+
+        while offset + record_size <= end:
+            ts_sec, ts_usec, incl_len, orig_len = unpack_from(buf, offset)
+
+            if offset + record_size + incl_len > end:
+                break
+
+            append(offset, ts_sec, ts_usec, incl_len)
+            offset += record_size + incl_len
+
+        return index
+
+    def _scan_file(self):
+        unpack = PcapFrameStructure.struct.unpack
+        record_size = PcapFrameStructure.struct.size
+
+        file_handle = self.file_handle
+        file_handle.seek(0, os.SEEK_END)
+        end = file_handle.tell()
+
+        index = PcapIndex(end)
+
+        offset = PcapHeaderStructure.struct.size
+        file_handle.seek(offset)
+
+        while offset + record_size <= end:
+            ts_sec, ts_usec, incl_len, orig_len = unpack(file_handle.read(record_size))
+
+            if offset + record_size + incl_len > end:
+                break
+
+            index.append(offset, ts_sec, ts_usec, incl_len)
+            offset += record_size + incl_len
+            file_handle.seek(offset)
+
+        return index
+
+    def load_index(self, index_path=None):
+        """
+        Load the frame index from its sidecar file, by default the path of
+        the capture with .idx appended. If the sidecar doesn't exist or
+        belongs to a capture of another size or modification time the index
+        is built, but not saved: only build_index writes the sidecar.
+        """
+
+        self._require_seekable()
+
+        if index_path is None and self.path is not None:
+            index_path = PcapIndex.default_path(self.path)
+
+        if index_path is not None and os.path.exists(index_path):
+            try:
+                index = PcapIndex.load(index_path)
+            except ValueError:
+                index = None
+
+            if index is not None and \
+                    index.capture_size == self._capture_size() and \
+                    index.capture_mtime == self._capture_mtime():
+                self.frame_index = index
+                return index
+
+        return self._build_index()
+
+    def summary(self):
+        """
+        The number of frames, their total length and the timestamps of the
+        first and the last frame. Only the record headers are read, or the
+        frame index is used if it's loaded.
+        """
+
+        index = self.frame_index
+
+        if index is not None:
+            count = len(index)
+            total = sum(index.lengths)
+
+            if count:
+                first = (index.ts_sec[0], index.ts_usec[0])
+                last = (index.ts_sec[-1], index.ts_usec[-1])
+        else:
+            count = 0
+            total = 0
+
+            for ts_sec, ts_usec, incl_len, orig_len in self._record_headers():
+                if not count:
+                    first = (ts_sec, ts_usec)
+
+                count += 1
+                total += incl_len
+
+            if count:
+                last = (ts_sec, ts_usec)
+
+        return {
+            'frames': count,
+            'bytes': total,
+            'first': timestamp_to_datetime(*first) if count else None,
+            'last': timestamp_to_datetime(*last) if count else None,
+        }
+
+    def _record_headers(self):
+        """
+        Iterate over the record headers of the complete records, without
+        touching the payloads.
+        """
+
+        record_size = PcapFrameStructure.struct.size
+        offset = PcapHeaderStructure.struct.size
+
+        mapping = self._scan_mapping() if self.seekable else None
+
+        if mapping is not None:
+            reader = BufferReader(mapping, offset)
+        else:
+            if self.seekable:
+                self.file_handle.seek(offset)
+
+            reader = BlockReader(self.file_handle, self.block_size, offset)
+
+        unpack_from = PcapFrameStructure.struct.unpack_from
+
+        try:
+            while True:
+                buf, offset = reader.read(record_size)
+                header = unpack_from(buf, offset)
+                reader.skip(header[2])
+
+                yield header
+        except EOFError:
+            pass
+        finally:
+            if mapping is not None and mapping is not self.mapping:
+                mapping.close()
+
+    def _capture_size(self):
+        if self.mapping is not None:
+            return len(self.mapping)
+
+        return os.fstat(self.file_handle.fileno()).st_size
+
+    def _capture_mtime(self):
+        try:
+            return os.fstat(self.file_handle.fileno()).st_mtime
+        except (AttributeError, IOError, OSError, ValueError):
+            return 0.0
+
+    def _require_seekable(self):
+        if self.mapping is None and not self.seekable:
+            raise ValueError("The capture is a stream, it can't be indexed or seeked")
+
+    def _require_index(self):
+        if self.frame_index is None:
+            self.load_index()
+
+        return self.frame_index
+
+    def frame_at(self, n):
+        """
+        Parse the n-th frame, using the frame index to find it.
+        """
+
+        index = self._require_index()
+
+        if n < 0:
+            n += len(index)
+
+        if not 0 <= n < len(index):
+            raise IndexError("frame index out of range")
+
+        offset = index.offsets[n]
+
+        if self.mapping is not None:
+            return PcapFrame.read(BufferReader(self.mapping, offset), self.frame_extra())
+
+        self.file_handle.seek(offset)
+
+        return PcapFrame.parse(self.file_handle, self.frame_extra())
+
+    def __len__(self):
+        return len(self._require_index())
+
+    def __nonzero__(self):
+        # Don't build the index to determine the truth value.
+        return True
+
+    __bool__ = __nonzero__
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self.frame_at(n) for n in range(*key.indices(len(self)))]
+
+        return self.frame_at(key)
+
+    def seek_offset(self, start):
+        """
+        The offset of the first frame recorded at or after the datetime
+        start, or the size of the capture if there is no such frame. The
+        frames are assumed to be in chronological order.
+
+        The frame index is used if it's loaded. Otherwise the capture is
+        bisected: from the middle of the window the next offset which
+        starts a run of plausible record headers is taken to be a record
+        boundary.
+        """
+
+        key = datetime_to_timestamp(start)
+        index = self.frame_index
+
+        if index is not None:
+            ts_sec = index.ts_sec
+            ts_usec = index.ts_usec
+
+            lo, hi = 0, len(index)
+
+            while lo < hi:
+                mid = (lo + hi) // 2
+
+                if (ts_sec[mid], ts_usec[mid]) < key:
+                    lo = mid + 1
+                else:
+                    hi = mid
+
+            if lo == len(index):
+                return index.capture_size
+
+            return index.offsets[lo]
+
+        self._require_seekable()
+
+        mapping = self._scan_mapping()
+
+        if mapping is None:
+            return self._walk_file(PcapHeaderStructure.struct.size, key)
+
+        try:
+            return self._bisect_buffer(mapping, key)
+        finally:
+            if mapping is not self.mapping:
+                mapping.close()
+
+    def _bisect_buffer(self, buf, key):
+        unpack_from = PcapFrameStructure.struct.unpack_from
+
+        # lo is always a record boundary of a frame before key, floor is
+        # its timestamp.
+        lo = PcapHeaderStructure.struct.size
+        hi = len(buf)
+
+        if lo + PcapFrameStructure.struct.size > hi:
+            return hi
+
+        floor = unpack_from(buf, lo)[:2]
+
+        if floor >= key:
+            return lo
+
+        # mid has to differ from lo for the window to shrink.
+        window = max(self.seek_window, 1)
+
+        while hi - lo > window:
+            mid = (lo + hi) // 2
+            offset = self._resync(buf, mid, hi, floor)
+
+            if offset is not None and unpack_from(buf, offset)[:2] < key:
+                lo = offset
+                floor = unpack_from(buf, offset)[:2]
+            else:
+                hi = mid
+
+        return self._walk_buffer(buf, lo, key)
+
+    def _resync(self, buf, offset, end, floor):
+        """
+        The first offset in [offset, end) which looks like the start of a
+        record recorded at or after floor, or None.
+        """
+
+        for candidate in range(offset, end):
+            if self._is_record_boundary(buf, candidate, floor):
+                return candidate
+
+        return None
+
+    def _is_record_boundary(self, buf, offset, floor):
+        unpack_from = PcapFrameStructure.struct.unpack_from
+        record_size = PcapFrameStructure.struct.size
+        size = len(buf)
+        snaplen = self.data.get('snaplen') or 0x40000
+
+        for _ in range(self.resync_records):
+            if offset == size:
+                return True
+
+            if offset + record_size > size:
+                return False
+
+            ts_sec, ts_usec, incl_len, orig_len = unpack_from(buf, offset)
+
+            if (ts_sec, ts_usec) < floor or ts_usec >= 1000000:
+                return False
+
+            # Runs of zeros in the payloads aren't records.
+            if ts_sec == 0 or incl_len == 0:
+                return False
+
+            # Frames are either complete or cut off at the snaplen.
+            if incl_len > snaplen or (incl_len != orig_len and incl_len != snaplen):
+                return False
+
+            floor = (ts_sec, ts_usec)
+            offset += record_size + incl_len
+
+        return offset <= size
+
+    def _walk_buffer(self, buf, offset, key):
+        unpack_from = PcapFrameStructure.struct.unpack_from
+        record_size = PcapFrameStructure.struct.size
+        size = len(buf)
+
+        while offset + record_size <= size:
+            ts_sec, ts_usec, incl_len, orig_len = unpack_from(buf, offset)
+
+            if (ts_sec, ts_usec) >= key:
+                return offset
+
+            offset += record_size + incl_len
+
+        return size
+
+    def _walk_file(self, offset, key):
+        unpack = PcapFrameStructure.struct.unpack
+        record_size = PcapFrameStructure.struct.size
+        file_handle = self.file_handle
+
+        while True:
+            file_handle.seek(offset)
+            header = file_handle.read(record_size)
+
+            if len(header) < record_size:
+                return offset
+
+            ts_sec, ts_usec, incl_len, orig_len = unpack(header)
+
+            if (ts_sec, ts_usec) >= key:
+                return offset
+
+            offset += record_size + incl_len
+
+    def frames(self, start=None, end=None, depth='full', where=None, sample=None):
+        """
+        Iterate over the frames. With start the iteration begins at the
+        first frame recorded at or after start (see seek_offset), with end
+        it stops at the first frame recorded after end. depth is one of
+        DEPTHS and determines how far the frames are parsed.
+
+        where is called with the PcapRecordHeader of every record before
+        anything else is read, records for which it returns False are
+        skipped.
+
+        sample is one of the samplers in sampling.py, it samples from the
+        records from start to end which pass where. Like with where the other records are
+        skipped. A Reservoir sample is chosen in a pass over the headers
+        of the whole range first.
+
+        Unless the file is mapped the frames are read in blocks of
+        block_size bytes. The payload of a frame is only valid until the
+        next frame is read, use PcapFrame.copy to keep a frame.
+        """
+
+        if isinstance(sample, Reservoir):
+            frames = self._reservoir_frames(sample, start, end, depth, where)
+        else:
+            if sample is not None:
+                where = _both(where, sample.predicate())
+
+            frames = self._frames(start, end, depth, where)
+
+        for frame in frames:
+            yield frame
+
+    def follow(self, poll_interval=1.0, idle_timeout=None):
+        """
+        Iterate over the frames of a capture which is still being written.
+        At the end of the file, also in the middle of a record, wait
+        poll_interval seconds and continue at the same offset. Stops when
+        no data arrived for idle_timeout seconds, if it's given.
+
+        Every frame gets a lag attribute: the timedelta between the time it
+        was recorded and the moment it was read.
+        """
+
+        if self.path is None:
+            raise ValueError("Following needs a capture on disk")
+
+        extra = self.frame_extra()
+        record_size = PcapFrameStructure.struct.size
+        unpack_from = PcapFrameStructure.struct.unpack_from
+        offset = PcapHeaderStructure.struct.size
+
+        # Unbuffered, stdio wouldn't read past an end of file it has seen.
+        file_handle = io.open(self.path, 'rb', buffering=0)
+        file_handle.seek(offset)
+
+        reader = BlockReader(file_handle, self.block_size, offset)
+
+        # When the last data arrived, None while there is data.
+        idle_since = None
+
+        try:
+            while True:
+                try:
+                    buf, offset = reader.peek(record_size)
+                    reader.peek(record_size + unpack_from(buf, offset)[2])
+                except EOFError:
+                    now = time.time()
+
+                    if idle_since is None:
+                        idle_since = now
+
+                    if idle_timeout is not None and now - idle_since >= idle_timeout:
+                        return
+
+                    time.sleep(poll_interval)
+                    continue
+
+                idle_since = None
+
+                frame = PcapFrame.read(reader, extra)
+                frame.lag = datetime.utcnow() - frame.time_recorded
+
+                yield frame
+        finally:
+            file_handle.close()
+
+    def _frames(self, start, end, depth, where):
+        extra = self.frame_extra(depth)
+        record_size = PcapFrameStructure.struct.size
+        unpack_from = PcapFrameStructure.struct.unpack_from
+
         # Start parsing right after the PCAP header.
+        offset = PcapHeaderStructure.struct.size
+
+        # Streams can't seek, the records before start are skipped.
+        start_key = None
+        end_key = datetime_to_timestamp(end) if end is not None else None
+
+        if start is not None:
+            if self.mapping is not None or self.seekable:
+                offset = self.seek_offset(start)
+            else:
+                start_key = datetime_to_timestamp(start)
+
+        reader = self._reader(offset)
+
+        while True:
+            try:
+                if start_key is not None or end_key is not None or where is not None:
+                    buf, offset = reader.peek(record_size)
+                    header = PcapRecordHeader._make(unpack_from(buf, offset))
+
+                    if end_key is not None and header[:2] > end_key:
+                        return
+
+                    if start_key is not None:
+                        if header[:2] < start_key:
+                            reader.skip(record_size + header.incl_len)
+                            continue
+
+                        start_key = None
+
+                    if where is not None and not where(header):
+                        reader.skip(record_size + header.incl_len)
+                        continue
+
+                frame = PcapFrame.read(reader, extra)
+            except EOFError:
+                return
+
+            yield frame
+
+    def _reservoir_frames(self, sample, start, end, depth, where):
+        extra = self.frame_extra(depth)
+        record_size = PcapFrameStructure.struct.size
+        unpack_from = PcapFrameStructure.struct.unpack_from
+
+        # The records are chosen by their offset in a mapping, records
+        # of streams are copied when they are chosen.
+        mapping = self._scan_mapping() if self.seekable else None
+        offset = PcapHeaderStructure.struct.size
+
+        if mapping is not None:
+            reader = BufferReader(mapping, offset)
+        else:
+            reader = self._reader(offset)
+
+        def headers():
+            while True:
+                try:
+                    buf, offset = reader.peek(record_size)
+                    header = PcapRecordHeader._make(unpack_from(buf, offset))
+                    size = record_size + header.incl_len
+
+                    # Only complete records.
+                    reader.peek(size)
+                except EOFError:
+                    return
+
+                yield header, size
+
+                reader.skip(size)
+
+        def keep(size):
+            if mapping is not None:
+                return reader.tell()
+
+            buf, offset = reader.peek(size)
+            return bytearray(buf[offset:offset + size])
+
+        try:
+            for item in select_records(headers(), start, end, where, sample, keep):
+                if mapping is not None:
+                    yield PcapFrame.read(BufferReader(mapping, item), extra)
+                else:
+                    yield PcapFrame.read(BufferReader(item), extra)
+        finally:
+            if mapping is not None and mapping is not self.mapping:
+                mapping.close()
+
+    def records(self):
+        """
+        Iterate over the raw records as (PcapRecordHeader, payload)
+        tuples, without parsing the payloads. As with frames, the payload
+        is a view which is only valid until the next record is read.
+        """
+
+        record_size = PcapFrameStructure.struct.size
+        unpack_from = PcapFrameStructure.struct.unpack_from
+
+        reader = self._reader(PcapHeaderStructure.struct.size)
+
+        while True:
+            try:
+                buf, offset = reader.read(record_size)
+                header = PcapRecordHeader._make(unpack_from(buf, offset))
+
+                buf, offset = reader.read(header.incl_len)
+            except EOFError:
+                return
+
+            yield header, buffer_slice(buf, offset, header.incl_len)
+
+    def _reader(self, offset):
+        """
+        A reader (see readers.py) which starts at offset.
+        """
+
+        if self.mapping is not None:
+            return BufferReader(self.mapping, offset)
 
         if self.seekable:
-            self.file_handle.seek(PcapHeaderStructure.struct.size)
+            self.file_handle.seek(offset)
 
-        # TODO: For now we support 127, 80211 RadioTap only.
-        extra = {
-            'payload_type': RadiotapFrame,
-        }
+        return BlockReader(self.file_handle, self.block_size, offset)
+
+    def chunk_offsets(self, count):
+        """
+        Split the capture into at most count byte ranges which start and
+        end on frame boundaries. Returns a list of (start, end) tuples.
+
+        The boundaries are taken from the frame index when it's loaded,
+        otherwise they are found by resynchronizing on the record headers
+        (see seek_offset).
+        """
+
+        self._require_seekable()
+
+        size = self._capture_size()
+        header_size = PcapHeaderStructure.struct.size
+        record_size = PcapFrameStructure.struct.size
+        index = self.frame_index
+
+        if index is not None:
+            starts = [index.offsets[len(index) * i // count] for i in range(count)] if len(index) else []
+        elif header_size + record_size > size:
+            # Not a single record.
+            starts = []
+        else:
+            starts = [header_size]
+            mapping = self._scan_mapping()
+
+            if mapping is not None:
+                unpack_from = PcapFrameStructure.struct.unpack_from
+
+                try:
+                    for i in range(1, count):
+                        if starts[-1] + record_size > size:
+                            break
+
+                        split = header_size + (size - header_size) * i // count
+                        floor = unpack_from(mapping, starts[-1])[:2]
+                        offset = self._resync(mapping, max(split, starts[-1] + 1), size, floor)
+
+                        if offset is None:
+                            break
+
+                        starts.append(offset)
+                finally:
+                    if mapping is not self.mapping:
+                        mapping.close()
+
+        starts = sorted(set(starts))
+
+        return list(zip(starts, starts[1:] + [size]))
+
+    def parallel_frames(self, fn, workers=None, chunks=None):
+        """
+        Parse the frames in a pool of worker processes and iterate over
+        fn(frame) for every frame, in the order of the frames.
+
+        The capture is split into chunks (by default four per worker,
+        see chunk_offsets) which every worker parses with its own mapping
+        of the file. fn and its results have to be picklable, so fn has to
+        be a function defined at the top level of a module.
+        """
+
+        for results in self._map_chunks(fn, None, workers, chunks):
+            for result in results:
+                yield result
+
+    def reduce_frames(self, fn, reducer, workers=None, chunks=None):
+        """
+        Like parallel_frames, but reduces the results with reducer. Every
+        worker reduces the results of its chunk, the results of the chunks
+        are reduced in the order of the frames. Raises ValueError if there
+        are no frames.
+        """
 
-        try_next_frame = True
+        partials = [
+            value
+            for has_value, value in self._map_chunks(fn, reducer, workers, chunks)
+            if has_value
+        ]
 
-        while try_next_frame:
+        if not partials:
+            raise ValueError("The capture doesn't contain any frames")
+
+        return reduce(reducer, partials)
+
+    def _map_chunks(self, fn, reducer, workers, chunks):
+        if self.path is None:
+            raise ValueError("Parallel parsing needs a capture on disk")
+
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+
+        if chunks is None:
+            chunks = workers * 4
+
+        tasks = [
+            (self.path, start, end, fn, reducer)
+            for start, end in self.chunk_offsets(chunks)
+        ]
+
+        if workers == 1:
+            for task in tasks:
+                yield _parse_chunk(task)
+
+            return
+
+        pool = multiprocessing.Pool(workers)
+
+        try:
+            for result in pool.imap(_parse_chunk, tasks):
+                yield result
+        finally:
+            pool.terminate()
+            pool.join()
+
+
+def _both(predicate, other):
+    """
+    A predicate which is true if both (optional) predicates are.
+    """
+
+    if predicate is None:
+        return other
+
+    return lambda header: predicate(header) and other(header)
+
+
+class PcapWriter(object):
+    """
+    Writes a PCAP file. The records are packed into a large buffer which
+    is written in one call when it's full, instead of one write per frame.
+
+    fsync is one of FSYNC_NEVER, FSYNC_CLOSE (after the last write) or
+    FSYNC_FLUSH (after every write of the buffer).
+    """
+
+    FSYNC_NEVER = 'never'
+    FSYNC_CLOSE = 'close'
+    FSYNC_FLUSH = 'flush'
+
+    header_struct = PcapHeaderStructure.struct
+    record_struct = PcapFrameStructure.struct
+
+    def __init__(self, file_handle, network=127, snaplen=65535,
+                 buffer_size=DEFAULT_BLOCK_SIZE, fsync=FSYNC_NEVER, header=True):
+
+        if fsync not in (self.FSYNC_NEVER, self.FSYNC_CLOSE, self.FSYNC_FLUSH):
+            raise ValueError("Unknown fsync policy {0}".format(fsync))
+
+        self.file_handle = file_handle
+        self.network = network
+        self.snaplen = snaplen
+        self.fsync = fsync
+
+        self.buf = bytearray(buffer_size)
+        self.used = 0
+
+        if header:
+            self.write_header()
+
+    @classmethod
+    def open(cls, path, **kwargs):
+        return cls(open(path, 'wb'), **kwargs)
+
+    def write_header(self):
+        self._reserve(self.header_struct.size)
+        self.header_struct.pack_into(
+            self.buf, self.used, 0xa1b2c3d4, 2, 4, 0, 0, self.snaplen, self.network
+        )
+        self.used += self.header_struct.size
+
+    def write_record(self, ts_sec, ts_usec, data, orig_len=None):
+        """
+        Append a record with the raw bytes in data, which is cut off at the
+        snaplen.
+        """
+
+        length = min(len(data), self.snaplen)
+
+        if orig_len is None:
+            orig_len = len(data)
+
+        size = self.record_struct.size + length
+        self._reserve(size)
+
+        buf = self.buf
+        used = self.used
+
+        self.record_struct.pack_into(buf, used, ts_sec, ts_usec, length, orig_len)
+        used += self.record_struct.size
+
+        if length > len(buf) - used:
+            # Larger than the buffer, write it straight to the file.
+            self.used = used
+            self._write_buffer()
+            self.file_handle.write(buffer_slice(data, 0, length))
+            return
+
+        buf[used:used + length] = buffer_slice(data, 0, length)
+        self.used = used + length
+
+    def write_frame(self, frame):
+        """
+        Append a PcapFrame (see frames).
+        """
+
+        ts_sec, ts_usec = datetime_to_timestamp(frame.time_recorded)
+        self.write_record(ts_sec, ts_usec, self.frame_payload(frame), frame.orig_len)
+
+    def write_frames(self, frames):
+        for frame in frames:
+            self.write_frame(frame)
+
+    @staticmethod
+    def frame_payload(frame):
+        """
+        The payload of frame, raises ValueError for frames read without
+        one (depth 'pcap').
+        """
+
+        if frame.payload is None:
+            raise ValueError("The frame has no payload, it was read with depth 'pcap'")
+
+        return frame.payload
+
+    @classmethod
+    def pack_record(cls, buf, offset, frame):
+        """
+        Pack the record of frame into buf at offset.
+        """
+
+        ts_sec, ts_usec = datetime_to_timestamp(frame.time_recorded)
+        payload = cls.frame_payload(frame)
+        length = len(payload)
+
+        cls.record_struct.pack_into(buf, offset, ts_sec, ts_usec, length, frame.orig_len)
+        offset += cls.record_struct.size
+        buf[offset:offset + length] = payload
+
+    def _reserve(self, size):
+        if self.used + size > len(self.buf):
+            self._write_buffer()
+
+    def _write_buffer(self):
+        if self.used:
+            self.file_handle.write(buffer_slice(self.buf, 0, self.used))
+            self.used = 0
+
+    def flush(self):
+        """
+        Write the buffered records to the file.
+        """
+
+        self._write_buffer()
+        self.file_handle.flush()
+
+        if self.fsync == self.FSYNC_FLUSH:
+            os.fsync(self.file_handle.fileno())
+
+    def close(self):
+        self.flush()
+
+        if self.fsync == self.FSYNC_CLOSE:
+            os.fsync(self.file_handle.fileno())
+
+        self.file_handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class RotatingPcapWriter(object):
+    """
+    Writes records like PcapWriter, but starts a new file when the
+    current one would grow beyond max_bytes or span max_duration (a
+    timedelta). A file is written as <prefix>.partial and renamed to
+    <prefix>-<first timestamp>-<last timestamp>.pcap when it's complete,
+    the paths of the complete files are in paths. kwargs are passed on to
+    PcapWriter.
+    """
+
+    def __init__(self, prefix, max_bytes=None, max_duration=None, **kwargs):
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.max_duration = None
+
+        if max_duration is not None:
+            self.max_duration = int(max_duration.total_seconds() * 1000000)
+
+        self.kwargs = kwargs
+        self.snaplen = kwargs.get('snaplen', 65535)
+
+        self.paths = []
+        self.writer = None
+
+    def write_record(self, ts_sec, ts_usec, data, orig_len=None):
+        size = PcapWriter.record_struct.size + min(len(data), self.snaplen)
+        timestamp = ts_sec * 1000000 + ts_usec
+
+        if self.writer is not None:
+            if self.max_bytes is not None and self.size + size > self.max_bytes:
+                self._finish()
+            elif self.max_duration is not None and timestamp - self.first >= self.max_duration:
+                self._finish()
+
+        if self.writer is None:
+            self.writer = PcapWriter.open(self.prefix + '.partial', **self.kwargs)
+            self.size = PcapWriter.header_struct.size
+            self.first = timestamp
+
+        self.writer.write_record(ts_sec, ts_usec, data, orig_len)
+        self.size += size
+        self.last = timestamp
+
+    def write_frame(self, frame):
+        ts_sec, ts_usec = datetime_to_timestamp(frame.time_recorded)
+        self.write_record(ts_sec, ts_usec, PcapWriter.frame_payload(frame), frame.orig_len)
+
+    def _finish(self):
+        self.writer.close()
+        self.writer = None
+
+        path = '{0}-{1}-{2}.pcap'.format(
+            self.prefix, self._format_time(self.first), self._format_time(self.last)
+        )
+
+        # Records with the same timestamps can end up in several files.
+        count = 1
+        unique_path = path
+
+        while os.path.exists(unique_path):
+            unique_path = '{0}-{1}.pcap'.format(path[:-len('.pcap')], count)
+            count += 1
+
+        os.rename(self.prefix + '.partial', unique_path)
+        self.paths.append(unique_path)
+
+    @staticmethod
+    def _format_time(timestamp):
+        ts_sec, ts_usec = divmod(timestamp, 1000000)
+
+        return '{0}.{1:06d}'.format(
+            timestamp_to_datetime(ts_sec, 0).strftime('%Y%m%dT%H%M%S'), ts_usec
+        )
+
+    def close(self):
+        if self.writer is not None:
+            self._finish()
+
+    def abort(self):
+        """
+        Close the current file without completing it, it's left behind as
+        <prefix>.partial.
+        """
+
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def _parse_chunk(task):
+    """
+    Run by the workers of PcapFile.parallel_frames and reduce_frames.
+    """
+
+    path, start, end, fn, reducer = task
+
+    pcap_file = PcapFile.open_mmap(path)
+
+    try:
+        reader = BufferReader(pcap_file.mapping, start, end)
+        extra = pcap_file.frame_extra()
+        results = []
+        has_value, value = False, None
+
+        while True:
             try:
-                yield PcapFrame.parse(
-                    self.file_handle,
-                    extra
-                )
+                frame = PcapFrame.read(reader, extra)
             except EOFError:
-                try_next_frame = False
+                break
+
+            result = fn(frame)
+
+            if reducer is None:
+                results.append(result)
+            elif has_value:
+                value = reducer(value, result)
+            else:
+                has_value, value = True, result
+    finally:
+        pcap_file.close()
+
+    if reducer is None:
+        return results
 
+    return has_value, value
@@ -0,0 +1,119 @@
+#
+# Copyright (c) 2015 Alexander Schrijver <alex@flupzor.nl>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+#
+
+"""
+A sidecar index of the frames in a PCAP file, which makes it possible to
+access frames by number without scanning the whole capture.
+"""
+
+import array
+import struct
+import sys
+
+
+# The typecode of the offsets, unsigned 64-bit integers. A long has 64
+# bits on LP64 platforms, elsewhere 'Q' (Python 3.3 and later) is used.
+OFFSET_TYPECODE = 'L' if array.array('L').itemsize == 8 else 'Q'
+
+
+class PcapIndex(object):
+    """
+    The byte offset, timestamp and length of every frame in a capture,
+    stored in one array per column.
+
+    The sidecar file starts with a header (see header_struct) which is
+    followed by the arrays in the order offsets, ts_sec, ts_usec, lengths.
+    Everything is stored little endian.
+    """
+
+    MAGIC = b'PPIX'
+    VERSION = 2
+
+    # magic, version, padding, number of frames, size and modification
+    # time of the capture.
+    header_struct = struct.Struct('<4sB3xQQd')
+
+    def __init__(self, capture_size=0, capture_mtime=0.0):
+        self.capture_size = capture_size
+        self.capture_mtime = capture_mtime
+
+        self.offsets = array.array(OFFSET_TYPECODE)
+        self.ts_sec = array.array('I')
+        self.ts_usec = array.array('I')
+        self.lengths = array.array('I')
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def append(self, offset, ts_sec, ts_usec, length):
+        self.offsets.append(offset)
+        self.ts_sec.append(ts_sec)
+        self.ts_usec.append(ts_usec)
+        self.lengths.append(length)
+
+    def columns(self):
+        return (self.offsets, self.ts_sec, self.ts_usec, self.lengths)
+
+    @staticmethod
+    def default_path(capture_path):
+        return capture_path + '.idx'
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.header_struct.pack(
+                self.MAGIC, self.VERSION, len(self), self.capture_size,
+                self.capture_mtime
+            ))
+
+            for column in self.columns():
+                if sys.byteorder == 'big':
+                    column = array.array(column.typecode, column)
+                    column.byteswap()
+
+                column.tofile(f)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load the index in the sidecar file at path. Raises ValueError if it
+        isn't an index.
+        """
+
+        with open(path, 'rb') as f:
+            header = f.read(cls.header_struct.size)
+
+            if len(header) != cls.header_struct.size:
+                raise ValueError("{0} is truncated".format(path))
+
+            magic, version, count, capture_size, capture_mtime = \
+                cls.header_struct.unpack(header)
+
+            if magic != cls.MAGIC or version != cls.VERSION:
+                raise ValueError("{0} is not a frame index".format(path))
+
+            index = cls(capture_size, capture_mtime)
+
+            try:
+                for column in index.columns():
+                    column.fromfile(f, count)
+            except EOFError:
+                raise ValueError("{0} is truncated".format(path))
+
+        if sys.byteorder == 'big':
+            for column in index.columns():
+                column.byteswap()
+
+        return index
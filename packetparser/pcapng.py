@@ -0,0 +1,548 @@
+#
+# Copyright (c) 2015 Alexander Schrijver <alex@flupzor.nl>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+#
+
+"""
+Reading and writing pcapng files. The Section Header, Interface
+Description, Enhanced Packet and Simple Packet blocks are supported, other
+blocks are skipped.
+"""
+
+from collections import namedtuple
+import mmap
+import struct
+
+from .base import PacketContainer
+from .pcap import (
+    PcapFrame, PcapRecordHeader, PcapWriter, check_depth, datetime_to_timestamp,
+    select_records, timestamp_to_datetime
+)
+from .link_types import payload_type_for
+from .readers import BlockReader, BufferReader, DEFAULT_BLOCK_SIZE, open_decompressed
+from .types import Structure, BigEndian, LittleEndian, Int64, UInt16, UInt32
+from .utils import buffer_slice
+
+
+SECTION_HEADER_BLOCK = 0x0a0d0d0a
+INTERFACE_DESCRIPTION_BLOCK = 0x00000001
+SIMPLE_PACKET_BLOCK = 0x00000003
+ENHANCED_PACKET_BLOCK = 0x00000006
+
+BYTE_ORDER_MAGIC = 0x1a2b3c4d
+
+OPTION_END = 0
+OPTION_IF_TSRESOL = 9
+
+
+class BlockHeaderStructure(Structure):
+    endianness = LittleEndian
+
+    attribute_list = (
+        ('block_type', UInt32),
+        ('block_total_length', UInt32),
+    )
+
+
+class SectionHeaderStructure(Structure):
+    """
+    The section header block after the byte order magic.
+    """
+
+    endianness = LittleEndian
+
+    attribute_list = (
+        ('version_major', UInt16),
+        ('version_minor', UInt16),
+        ('section_length', Int64),
+    )
+
+
+class InterfaceDescriptionStructure(Structure):
+    endianness = LittleEndian
+
+    attribute_list = (
+        ('link_type', UInt16),
+        ('reserved', UInt16),
+        ('snaplen', UInt32),
+    )
+
+
+class EnhancedPacketStructure(Structure):
+    endianness = LittleEndian
+
+    attribute_list = (
+        ('interface_id', UInt32),
+        ('ts_high', UInt32),
+        ('ts_low', UInt32),
+        ('captured_len', UInt32),
+        ('orig_len', UInt32),
+    )
+
+
+class OptionHeaderStructure(Structure):
+    endianness = LittleEndian
+
+    attribute_list = (
+        ('option_code', UInt16),
+        ('option_length', UInt16),
+    )
+
+
+def _structures(endianness):
+    """
+    The structs of the blocks, for a section in the given byte order.
+    """
+
+    structures = {}
+
+    for cls in (BlockHeaderStructure, SectionHeaderStructure,
+                InterfaceDescriptionStructure, EnhancedPacketStructure,
+                OptionHeaderStructure):
+        if endianness is not cls.endianness:
+            cls = type(cls)(cls.__name__, (cls, ), {'endianness': endianness})
+
+        structures[cls.__name__] = cls.struct
+
+    return structures
+
+
+STRUCTS = {
+    '<': _structures(LittleEndian),
+    '>': _structures(BigEndian),
+}
+
+
+def _padded(length):
+    return (length + 3) & ~3
+
+
+# resolution is the number of timestamp units per second.
+PcapngInterface = namedtuple('PcapngInterface', ('link_type', 'snaplen', 'resolution'))
+
+
+class PcapngFrame(PcapFrame):
+    """
+    A packet from an Enhanced or Simple Packet Block. Like PcapFrame, the
+    payload is handed off to the layer of the link type of its interface.
+    """
+    name = 'pcapng_frame'
+
+
+class PcapngFile(PacketContainer):
+    """
+    Reads a pcapng file one block at the time, either from a mapping
+    of the file or in blocks of block_size bytes (see readers.py).
+    """
+
+    block_size = DEFAULT_BLOCK_SIZE
+
+    def __init__(self, data, file_handle, seekable=True, mapping=None):
+        self.file_handle = file_handle
+        self.seekable = seekable
+        self.mapping = mapping
+
+        # The state of the section being read.
+        self.byte_order = None
+        self.structs = None
+        self.interfaces = []
+        self.payload_types = []
+
+        # Streams continue reading after the section header.
+        self.stream_reader = None
+
+        self.data = data
+
+    @classmethod
+    def parse_header(cls, file_handle, seekable=True):
+        if seekable:
+            file_handle.seek(0)
+
+        pcapng_file = cls({}, file_handle, seekable=seekable)
+        reader = BlockReader(file_handle, cls.block_size)
+        pcapng_file._read_first_block(reader)
+
+        if not seekable:
+            pcapng_file.stream_reader = reader
+
+        return pcapng_file
+
+    @classmethod
+    def open(cls, path):
+        """
+        Open the capture at path, see PcapFile.open.
+        """
+
+        file_handle, compressed = open_decompressed(path)
+
+        if not compressed:
+            file_handle.close()
+            return cls.open_mmap(path)
+
+        return cls.parse_header(file_handle, seekable=False)
+
+    @classmethod
+    def open_mmap(cls, path):
+        """
+        Open the capture at path by mapping it into memory, see
+        PcapFile.open_mmap.
+        """
+
+        file_handle = open(path, 'rb')
+        mapping = mmap.mmap(file_handle.fileno(), 0, access=mmap.ACCESS_READ)
+
+        pcapng_file = cls({}, file_handle, mapping=mapping)
+        pcapng_file._read_first_block(BufferReader(mapping))
+
+        return pcapng_file
+
+    def close(self):
+        if self.mapping is not None:
+            self.mapping.close()
+
+        self.file_handle.close()
+
+    def _read_first_block(self, reader):
+        try:
+            block_type, buf, offset, length = self._read_block(reader)
+        except EOFError:
+            block_type = None
+
+        if block_type != SECTION_HEADER_BLOCK:
+            raise ValueError("Not a pcapng file")
+
+    def _read_block(self, reader):
+        """
+        Read the next block. Returns the block type and the (buf, offset,
+        length) of its body, without the trailing length. Section headers
+        are processed here, as they determine the byte order.
+        """
+
+        byte_order = self.byte_order or '<'
+
+        buf, offset = reader.read(8)
+        block_type, total_length = struct.unpack_from(byte_order + 'II', buf, offset)
+
+        # The block type of a section header reads the same in both byte
+        # orders, its byte order magic tells how to read the rest.
+        if block_type == SECTION_HEADER_BLOCK:
+            buf, offset = reader.read(4)
+
+            for new_byte_order in ('<', '>'):
+                if struct.unpack_from(new_byte_order + 'I', buf, offset)[0] == BYTE_ORDER_MAGIC:
+                    break
+            else:
+                raise ValueError("Invalid byte order magic")
+
+            if new_byte_order != byte_order:
+                total_length = struct.unpack(
+                    new_byte_order + 'I', struct.pack(byte_order + 'I', total_length)
+                )[0]
+
+            self._check_block_length(total_length)
+
+            buf, offset = reader.read(total_length - 12)
+            self._section_header(new_byte_order, buf, offset)
+
+            return block_type, buf, offset, total_length - 16
+
+        if self.byte_order is None:
+            raise ValueError("Not a pcapng file")
+
+        self._check_block_length(total_length)
+
+        buf, offset = reader.read(total_length - 8)
+
+        return block_type, buf, offset, total_length - 12
+
+    @staticmethod
+    def _check_block_length(total_length):
+        # A block has at least its type and two lengths, padded to 32 bits.
+        if total_length < 12 or total_length % 4:
+            raise ValueError("Invalid block length {0}".format(total_length))
+
+    def _section_header(self, byte_order, buf, offset):
+        self.byte_order = byte_order
+        self.structs = STRUCTS[byte_order]
+        self.interfaces = []
+        self.payload_types = []
+
+        version_major, version_minor, section_length = \
+            self.structs['SectionHeaderStructure'].unpack_from(buf, offset)
+
+        self.data = {
+            'byte_order': byte_order,
+            'version_major': version_major,
+            'version_minor': version_minor,
+            'section_length': section_length,
+        }
+
+    def _interface_description(self, buf, offset, length):
+        interface_struct = self.structs['InterfaceDescriptionStructure']
+        option_struct = self.structs['OptionHeaderStructure']
+
+        link_type, reserved, snaplen = interface_struct.unpack_from(buf, offset)
+
+        resolution = 1000000
+
+        option_offset = offset + interface_struct.size
+        end = offset + length
+
+        while option_offset + option_struct.size <= end:
+            code, option_length = option_struct.unpack_from(buf, option_offset)
+            option_offset += option_struct.size
+
+            if code == OPTION_END:
+                break
+
+            if code == OPTION_IF_TSRESOL:
+                tsresol = struct.unpack_from('B', buf, option_offset)[0]
+
+                if tsresol & 0x80:
+                    resolution = 2 ** (tsresol & 0x7f)
+                else:
+                    resolution = 10 ** tsresol
+
+            option_offset += _padded(option_length)
+
+        self.interfaces.append(PcapngInterface(link_type, snaplen, resolution))
+        self.payload_types.append(payload_type_for(link_type))
+
+    def _packets(self, reader):
+        """
+        Iterate over the packets as (PcapRecordHeader, packet) tuples, the
+        packet is the (interface_id, interface, payload_type, buf, offset)
+        of the packet data. Interface Description Blocks are processed on
+        the way.
+        """
+
+        while True:
+            try:
+                block_type, buf, offset, length = self._read_block(reader)
+            except EOFError:
+                return
+
+            if block_type == ENHANCED_PACKET_BLOCK:
+                packet_struct = self.structs['EnhancedPacketStructure']
+
+                if length < packet_struct.size:
+                    raise ValueError("Enhanced Packet Block of {0} bytes".format(length))
+
+                interface_id, ts_high, ts_low, captured_len, orig_len = \
+                    packet_struct.unpack_from(buf, offset)
+
+                # The packet data can't extend beyond the block.
+                captured_len = min(captured_len, length - packet_struct.size)
+                timestamp = (ts_high << 32) | ts_low
+                offset += packet_struct.size
+
+            elif block_type == SIMPLE_PACKET_BLOCK:
+                interface_id = 0
+                orig_len = struct.unpack_from(self.byte_order + 'I', buf, offset)[0]
+                captured_len = min(orig_len, self.interfaces[0].snaplen or orig_len, length - 4)
+                timestamp = 0
+                offset += 4
+
+            else:
+                if block_type == INTERFACE_DESCRIPTION_BLOCK:
+                    self._interface_description(buf, offset, length)
+
+                continue
+
+            interface = self.interfaces[interface_id]
+
+            ts_sec, units = divmod(timestamp, interface.resolution)
+            ts_usec = units * 1000000 // interface.resolution
+
+            yield PcapRecordHeader(ts_sec, ts_usec, captured_len, orig_len), (
+                interface_id, interface, self.payload_types[interface_id], buf, offset
+            )
+
+    def _frame(self, header, packet, depth):
+        interface_id, interface, payload_type, buf, offset = packet
+        captured_len = header.incl_len
+
+        frame = PcapngFrame({
+            'time_recorded': timestamp_to_datetime(header.ts_sec, header.ts_usec),
+            'len': captured_len,
+            'orig_len': header.orig_len,
+            'interface_id': interface_id,
+            'link_type': interface.link_type,
+        })
+
+        if depth != 'full':
+            frame.depth = depth
+
+        if depth == 'pcap':
+            frame.payload = None
+            frame.payload_type = None
+            return frame
+
+        frame.payload = buffer_slice(buf, offset, captured_len)
+        frame.payload_type = payload_type
+
+        if payload_type is not None:
+            payload = payload_type.parse(
+                buf,
+                {'upper_layer': frame, 'depth': depth},
+                offset,
+                offset + captured_len
+            )
+
+            setattr(frame, payload_type.name, payload)
+
+        return frame
+
+    def frames(self, start=None, end=None, depth='full', where=None, sample=None):
+        """
+        Iterate over the packets of all sections and interfaces. The
+        arguments are those of PcapFile.frames, where is called with a
+        PcapRecordHeader of every packet. Without an index the packets
+        before start are read and skipped.
+
+        As with PcapFile.frames, the payload of a frame read from a file
+        which isn't mapped is only valid until the next frame is read.
+        """
+
+        check_depth(depth)
+
+        if self.mapping is not None:
+            reader = BufferReader(self.mapping)
+        elif self.seekable:
+            self.file_handle.seek(0)
+            reader = BlockReader(self.file_handle, self.block_size)
+        else:
+            reader = self.stream_reader
+
+        def keep(item):
+            if self.mapping is not None:
+                return item
+
+            # Copy the packet data out of the block buffer.
+            header, (interface_id, interface, payload_type, buf, offset) = item
+            payload = bytearray(buffer_slice(buf, offset, header.incl_len))
+
+            return header, (interface_id, interface, payload_type, payload, 0)
+
+        packets = ((header, (header, packet)) for header, packet in self._packets(reader))
+
+        for header, packet in select_records(packets, start, end, where, sample, keep):
+            yield self._frame(header, packet, depth)
+
+
+class PcapngWriter(PcapWriter):
+    """
+    Writes a pcapng file with one section, in the buffered way of
+    PcapWriter. The first interface is described by network and snaplen,
+    more can be added with add_interface. Timestamps are written in
+    microseconds.
+    """
+
+    block_header_struct = BlockHeaderStructure.struct
+    section_header_struct = SectionHeaderStructure.struct
+    interface_struct = InterfaceDescriptionStructure.struct
+    packet_struct = EnhancedPacketStructure.struct
+    length_struct = struct.Struct('<I')
+
+    def write_header(self):
+        self.snaplens = []
+
+        length = self.block_header_struct.size + 4 + \
+            self.section_header_struct.size + self.length_struct.size
+
+        self._reserve(length)
+        self.block_header_struct.pack_into(self.buf, self.used, SECTION_HEADER_BLOCK, length)
+        self.length_struct.pack_into(self.buf, self.used + 8, BYTE_ORDER_MAGIC)
+        self.section_header_struct.pack_into(self.buf, self.used + 12, 1, 0, -1)
+        self.length_struct.pack_into(self.buf, self.used + length - 4, length)
+        self.used += length
+
+        self.add_interface(self.network, self.snaplen)
+
+    def add_interface(self, link_type, snaplen=65535):
+        """
+        Describe an interface, returns its interface id.
+        """
+
+        length = self.block_header_struct.size + self.interface_struct.size + \
+            self.length_struct.size
+
+        self._reserve(length)
+        self.block_header_struct.pack_into(self.buf, self.used, INTERFACE_DESCRIPTION_BLOCK, length)
+        self.interface_struct.pack_into(self.buf, self.used + 8, link_type, 0, snaplen)
+        self.length_struct.pack_into(self.buf, self.used + length - 4, length)
+        self.used += length
+
+        self.snaplens.append(snaplen)
+
+        return len(self.snaplens) - 1
+
+    def write_record(self, ts_sec, ts_usec, data, orig_len=None, interface_id=0):
+        """
+        Append an Enhanced Packet Block with the raw bytes in data, which
+        is cut off at the snaplen of the interface.
+        """
+
+        length = min(len(data), self.snaplens[interface_id])
+
+        if orig_len is None:
+            orig_len = len(data)
+
+        header_size = self.block_header_struct.size + self.packet_struct.size
+        padding = _padded(length) - length
+        total_length = header_size + length + padding + self.length_struct.size
+
+        timestamp = ts_sec * 1000000 + ts_usec
+
+        self._reserve(total_length)
+
+        if total_length > len(self.buf):
+            # Larger than the buffer, write it straight to the file.
+            self._write_buffer()
+            buf = bytearray(total_length)
+            used = 0
+        else:
+            buf = self.buf
+            used = self.used
+
+        self.block_header_struct.pack_into(buf, used, ENHANCED_PACKET_BLOCK, total_length)
+        self.packet_struct.pack_into(
+            buf, used + 8, interface_id, timestamp >> 32, timestamp & 0xffffffff, length, orig_len
+        )
+        used += header_size
+
+        buf[used:used + length] = buffer_slice(data, 0, length)
+        used += length
+
+        buf[used:used + padding] = b'\x00' * padding
+        self.length_struct.pack_into(buf, used + padding, total_length)
+        used += padding + self.length_struct.size
+
+        if buf is self.buf:
+            self.used = used
+        else:
+            self.file_handle.write(buf)
+
+    def write_frame(self, frame):
+        """
+        Append a PcapFrame or PcapngFrame, on the interface of the frame if
+        it has one.
+        """
+
+        ts_sec, ts_usec = datetime_to_timestamp(frame.time_recorded)
+        interface_id = getattr(frame, 'interface_id', 0)
+
+        self.write_record(
+            ts_sec, ts_usec, self.frame_payload(frame), frame.orig_len, interface_id
+        )
@@ -15,12 +15,20 @@
 #
 
 from datetime import timedelta
+import struct
 
 from .base import PacketContainer
-from .types import UInt32, UInt16, Int8, UInt8, Int32, UInt64, Structure
+from .types import (
+    UInt32, UInt16, Int8, UInt8, Int32, UInt64, Structure, Computed, Flags
+)
 from .ieee80211 import parse_ieee80211_frame
 from .utils import field_is_set
 
+
+def microseconds_to_timedelta(microseconds):
+    return timedelta(microseconds=microseconds)
+
+
 class RadioTapTSFT(Structure):
     """
         Bitmap id: 0
@@ -35,11 +43,10 @@ class RadioTapTSFT(Structure):
         ('tsft', UInt64),
     )
 
-    @classmethod
-    def to_python(cls, data):
-        return {
-            'tsft': timedelta(microseconds=data.get('tsft')),
-        }
+    lazy = True
+    python_attribute_list = (
+        ('tsft', Computed(microseconds_to_timedelta, 'tsft')),
+    )
 
 
 class RadioTapFlags(Structure):
@@ -49,22 +56,18 @@ class RadioTapFlags(Structure):
     """
     required_alignment = 1
     attribute_list = (
-        ('flags', UInt8),
+        ('flags', Flags(UInt8, (
+            ('during_cfp', 0x01),
+            ('with_short_preamble', 0x02),
+            ('with_wep', 0x04),
+            ('with_fragmentation', 0x08),
+            ('with_includes_fcs', 0x10),
+            ('is_padded', 0x20),
+            ('failed_fcs_check', 0x40),
+        ))),
     )
 
-    @classmethod
-    def to_python(cls, data):
-        flags = data.get('flags')
-
-        return {
-            'during_cfp': field_is_set(flags, 0x01),
-            'with_short_preamble': field_is_set(flags, 0x02),
-            'with_wep': field_is_set(flags, 0x04),
-            'with_fragmentation': field_is_set(flags, 0x08),
-            'with_includes_fcs': field_is_set(flags, 0x10),
-            'is_padded': field_is_set(flags, 0x20),
-            'failed_fcs_check': field_is_set(flags, 0x40),
-        }
+    lazy = True
 
 class RadioTapRate(Structure):
     """
@@ -86,29 +89,19 @@ class RadioTapChannel(Structure):
     required_alignment = 2
     attribute_list = (
         ('frequency', UInt16),
-        ('flags', UInt16),
+        ('flags', Flags(UInt16, (
+            ('turbo_channel', 0x0010),
+            ('cck_channel', 0x0020),
+            ('ofdm_channel', 0x0040),
+            ('band_2ghz', 0x0080),
+            ('band_5ghz', 0x0100),
+            ('passive', 0x0200),
+            ('dynamic', 0x0400),
+            ('gfsk', 0x0800),
+        ))),
     )
 
-    @classmethod
-    def to_python(cls, data):
-        parsed_data = {}
-
-        flags = data.get('flags')
-        frequency = data.get('frequency')
-
-        return {
-            'frequency': frequency,
-            'turbo_channel': field_is_set(flags, 0x0010),
-            'cck_channel': field_is_set(flags, 0x0020),
-            'ofdm_channel': field_is_set(flags, 0x0040),
-            'band_2ghz': field_is_set(flags, 0x0080),
-            'band_5ghz': field_is_set(flags, 0x0100),
-            'passive': field_is_set(flags, 0x0200),
-            'dynamic': field_is_set(flags, 0x0400),
-            'gfsk': field_is_set(flags, 0x0800),
-        }
-
-        return parsed_data
+    lazy = True
 
 
 class RadioTapFHSS(Structure):
@@ -294,6 +287,10 @@ class RadioTapFrameStructure(Structure):
         ('header_length', UInt16),
     )
 
+    @classmethod
+    def keys(cls):
+        return ('version', 'header_length')
+
     @classmethod
     def to_python(cls, data):
         return {
@@ -302,6 +299,62 @@ class RadioTapFrameStructure(Structure):
         }
 
 
+class RadiotapLayout(object):
+    """
+    The layout of the fields for a tuple of present bitmaps: one struct
+    which unpacks all the present fields (including their alignment
+    padding) and for every field its class and the index of its first
+    value. size is the length of the bitmaps and fields together,
+    relative to the start of the radiotap header.
+    """
+
+    def __init__(self, bitmaps, extended_field_mapper):
+        fields_found = set()
+
+        for bitmap_number, present_field in enumerate(bitmaps, 1):
+            for j in range(0, 32):
+                if field_is_set(present_field, 1 << j):
+                    fields_found.add(j * bitmap_number)
+
+        i = RadioTapFrameStructure.struct.size + \
+            len(bitmaps) * RadioTapBitmap.struct.size
+        start = i
+
+        format_chars = ''
+        fields = []
+        value_count = 0
+
+        for bitmap_id, ext_field_cls in extended_field_mapper:
+            if bitmap_id not in fields_found:
+                continue
+
+            req_align = ext_field_cls.required_alignment
+            padding = (req_align - i % req_align) % req_align
+
+            format_chars += 'x' * padding + ext_field_cls._format_chars
+            fields.append((ext_field_cls._build, value_count))
+
+            i += padding + ext_field_cls._struct_size
+            value_count += ext_field_cls._value_count
+
+        self.start = start
+        self.size = i
+        self.fields = tuple(fields)
+        self.struct = struct.Struct(
+            RadioTapBitmap.endianness.format_char + format_chars
+        )
+
+    def unpack(self, buf, offset):
+        """
+        The structures of the present fields of the radiotap header at
+        offset.
+        """
+
+        values = self.struct.unpack_from(buf, offset + self.start)
+
+        return tuple(build(values, base) for build, base in self.fields)
+
+
 
 class RadiotapFrame(PacketContainer):
     """
@@ -311,6 +364,11 @@ class RadiotapFrame(PacketContainer):
 
     RADIOTAP_ANOTHER_BITMAP = 1 << 31
 
+    # The layouts by their tuple of present bitmaps, a capture only uses
+    # a few of them. Beyond LAYOUT_CACHE_SIZE layouts aren't cached.
+    LAYOUT_CACHE_SIZE = 256
+    layouts = {}
+
     extended_field_mapper = (
         (0, RadioTapTSFT),
         (1, RadioTapFlags),
@@ -331,60 +389,69 @@ class RadiotapFrame(PacketContainer):
 #        (16, RadioTapRSSI),
     )
 
+    @classmethod
+    def radio_header_length(cls, buf, offset=0):
+        """
+        The length of the radiotap header at offset.
+        """
+
+        return RadioTapFrameStructure.struct.unpack_from(buf, offset)[2]
 
     @classmethod
-    def parse(cls, buf, extra=None):
+    def parse(cls, buf, extra=None, offset=0, end=None):
+        if end is None:
+            end = len(buf)
+
+        # i is relative to the start of the radiotap header, the fields
+        # are aligned relative to it.
         i = 0
-        frame_struct = RadioTapFrameStructure.unpack(buf)
+        frame_struct = RadioTapFrameStructure.unpack_within(buf, offset, end)
         header_length = frame_struct.header_length
 
-        radiotap_header_array = buf[:header_length]
-        ieee80211_array = buf[header_length:]
-
         i += frame_struct.struct.size
 
-        assert len(radiotap_header_array) == header_length
+        assert offset + header_length <= end
 
-        fields_found = []
-        bitmap_number = 1
-        while True:
-            bitmap = RadioTapBitmap.unpack(radiotap_header_array[i:])
-            present_field = bitmap.present
-            i += bitmap.size()
+        bitmaps = []
+        unpack_bitmap = RadioTapBitmap.struct.unpack_from
+        bitmap_size = RadioTapBitmap.struct.size
 
-            for j in range(0, 32):
-                if field_is_set(present_field, 1 << j):
-                    fields_found.append(j * bitmap_number)
+        while i + bitmap_size <= header_length:
+            present_field, = unpack_bitmap(buf, offset + i)
+            bitmaps.append(present_field)
+            i += bitmap_size
 
             # TODO: Set a limit here of max. number of bitmaps.
             if not field_is_set(present_field, cls.RADIOTAP_ANOTHER_BITMAP):
-                break;
+                break
 
-            bitmap_number += 1
+        bitmaps = tuple(bitmaps)
+        layout = cls.layouts.get(bitmaps)
 
-        data = {}
+        if layout is None:
+            layout = RadiotapLayout(bitmaps, cls.extended_field_mapper)
 
-        for bitmap_id, ext_field_cls in cls.extended_field_mapper:
+            if len(cls.layouts) < cls.LAYOUT_CACHE_SIZE:
+                cls.layouts[bitmaps] = layout
 
-            if bitmap_id in fields_found:
-                req_align = ext_field_cls.required_alignment
-                padding = (req_align - i % req_align) % req_align
+        # Test if we haven't gone beyond the end of the header.
+        assert layout.size <= header_length
 
-                # TODO: test if the padding is zero
-                # Test if we haven't gone beyond the end of the buffer.
-                i += padding
+        # TODO: test if the padding is zero
+        frame = cls(None, structures=layout.unpack(buf, offset))
 
-                field_instance = ext_field_cls.unpack(radiotap_header_array[i:])
-                data.update(field_instance.data)
-                i += field_instance.size()
+        depth = extra.get('depth', 'full') if extra else 'full'
 
-        frame = cls(data)
+        if depth == 'radiotap':
+            frame.ieee80211_frame = None
+            return frame
 
         extra = {
             'upper_layer': frame,
+            'depth': depth,
         }
 
-        payload = parse_ieee80211_frame(ieee80211_array, extra)
+        payload = parse_ieee80211_frame(buf, extra, offset + header_length, end)
 
         # Attach the payload to the frame.
         frame.ieee80211_frame = payload
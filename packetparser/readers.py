@@ -0,0 +1,245 @@
+#
+# Copyright (c) 2015 Alexander Schrijver <alex@flupzor.nl>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+#
+
+"""
+Readers which hand out the bytes of a capture to the parsers.
+
+A reader returns (buf, offset) tuples, the parsers unpack the data in
+place at offset in buf.
+"""
+
+import bz2
+import gzip
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+
+GZIP_MAGIC = b'\x1f\x8b'
+BZIP2_MAGIC = b'BZh'
+XZ_MAGIC = b'\xfd7zXZ\x00'
+
+
+def open_decompressed(path):
+    """
+    Open the file at path for reading. Files compressed with gzip, bzip2
+    or xz, recognized by their magic bytes, are decompressed while they
+    are read. Returns the file and whether it's compressed.
+    """
+
+    with open(path, 'rb') as f:
+        magic = f.read(len(XZ_MAGIC))
+
+    if magic.startswith(GZIP_MAGIC):
+        return gzip.open(path, 'rb'), True
+
+    if magic.startswith(BZIP2_MAGIC):
+        return bz2.BZ2File(path, 'rb'), True
+
+    if magic.startswith(XZ_MAGIC):
+        if lzma is None:
+            raise ImportError("xz compressed files require lzma (backports.lzma on Python 2)")
+
+        return lzma.open(path, 'rb'), True
+
+    return open(path, 'rb'), False
+
+
+class BufferReader(object):
+    """
+    Reads from a buffer which holds the whole capture, for example a mmap.
+    Nothing is copied, the returned buf is the buffer itself.
+    """
+
+    def __init__(self, buf, offset=0, end=None):
+        self.buf = buf
+        self.offset = offset
+        self.end = len(buf) if end is None else end
+
+    def read(self, size):
+        """
+        Returns (buf, offset) for the next size bytes and advances past
+        them. Raises EOFError if there are less than size bytes left.
+        """
+
+        if size < 0:
+            raise ValueError("Negative size {0}".format(size))
+
+        offset = self.offset
+
+        if offset + size > self.end:
+            raise EOFError()
+
+        self.offset = offset + size
+
+        return self.buf, offset
+
+    def peek(self, size):
+        """
+        Like read, but doesn't advance.
+        """
+
+        if self.offset + size > self.end:
+            raise EOFError()
+
+        return self.buf, self.offset
+
+    def skip(self, size):
+        """
+        Advance past size bytes.
+        """
+
+        if size < 0:
+            raise ValueError("Negative size {0}".format(size))
+
+        if self.offset + size > self.end:
+            raise EOFError()
+
+        self.offset += size
+
+    def tell(self):
+        return self.offset
+
+
+DEFAULT_BLOCK_SIZE = 1 << 20
+
+
+class BlockReader(object):
+    """
+    Reads a file in large blocks into a reusable buffer, for files which
+    can't be mapped such as pipes and compressed streams. Records which
+    cross the end of a block are carried over to the start of the next.
+
+    The returned buf is that buffer: its contents are only valid until the
+    next read which refills it. Anything which outlives that has to be
+    copied out (see PcapFrame.copy).
+    """
+
+    def __init__(self, file_handle, block_size=DEFAULT_BLOCK_SIZE, offset=0):
+        self.file_handle = file_handle
+        self.block_size = block_size
+        self.buf = bytearray(block_size)
+        self.start = 0
+        self.end = 0
+
+        # The offset in the file of buf[start].
+        self.offset = offset
+
+    def read(self, size):
+        """
+        Returns (buf, offset) for the next size bytes and advances past
+        them. Raises EOFError if there are less than size bytes left.
+        """
+
+        if size < 0:
+            raise ValueError("Negative size {0}".format(size))
+
+        if self.end - self.start < size:
+            self._fill(size)
+
+        start = self.start
+        self.start = start + size
+        self.offset += size
+
+        return self.buf, start
+
+    def peek(self, size):
+        """
+        Like read, but doesn't advance. If the file ends before size bytes
+        nothing is lost, the next read or peek continues where the file
+        ended, for example once it has grown.
+        """
+
+        if self.end - self.start < size:
+            self._fill(size)
+
+        return self.buf, self.start
+
+    def skip(self, size):
+        """
+        Advance past size bytes. Bytes which aren't buffered yet are read
+        over a block at the time into the buffer, nothing is allocated.
+        """
+
+        if size < 0:
+            raise ValueError("Negative size {0}".format(size))
+
+        remaining = size - (self.end - self.start)
+
+        if remaining <= 0:
+            self.start += size
+            self.offset += size
+            return
+
+        self.start = self.end = 0
+        view = memoryview(self.buf)
+
+        while True:
+            count = self._readinto(view)
+
+            if not count:
+                raise EOFError()
+
+            if count >= remaining:
+                self.start = remaining
+                self.end = count
+                break
+
+            remaining -= count
+
+        self.offset += size
+
+    def _fill(self, size):
+        remaining = self.end - self.start
+
+        if size > len(self.buf):
+            buf = bytearray(max(size, self.block_size))
+            buf[:remaining] = self.buf[self.start:self.end]
+            self.buf = buf
+        else:
+            self.buf[:remaining] = self.buf[self.start:self.end]
+
+        self.start = 0
+        self.end = remaining
+
+        view = memoryview(self.buf)
+
+        while self.end < size:
+            count = self._readinto(view[self.end:])
+
+            if not count:
+                raise EOFError()
+
+            self.end += count
+
+    def _readinto(self, view):
+        readinto = getattr(self.file_handle, 'readinto', None)
+
+        if readinto is not None:
+            return readinto(view)
+
+        data = self.file_handle.read(len(view))
+        view[:len(data)] = data
+
+        return len(data)
+
+    def tell(self):
+        return self.offset
@@ -0,0 +1,112 @@
+#
+# Copyright (c) 2015 Alexander Schrijver <alex@flupzor.nl>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+#
+
+"""
+Samplers for the sample argument of PcapFile.frames. The samplers decide
+on the record headers, the records which aren't sampled are skipped
+without reading their payload.
+"""
+
+import random
+
+
+class EveryNth(object):
+    """
+    Every n-th record, starting with record number phase.
+    """
+
+    def __init__(self, n, phase=0):
+        if n < 1:
+            raise ValueError("n should be at least 1")
+
+        self.n = n
+        self.phase = phase
+
+    def predicate(self):
+        """
+        A new predicate on PcapRecordHeaders, see the where argument of
+        PcapFile.frames.
+        """
+
+        counter = [-1]
+        n = self.n
+        phase = self.phase
+
+        def predicate(header):
+            counter[0] += 1
+            return counter[0] >= phase and (counter[0] - phase) % n == 0
+
+        return predicate
+
+
+class Bernoulli(object):
+    """
+    Every record with probability, deterministic for a given seed.
+    """
+
+    def __init__(self, probability, seed=None):
+        self.probability = probability
+        self.seed = seed
+
+    def predicate(self):
+        rng = random.Random(self.seed)
+        probability = self.probability
+
+        def predicate(header):
+            return rng.random() < probability
+
+        return predicate
+
+
+class Reservoir(object):
+    """
+    A uniform sample of size records (or all records if there are less),
+    in the order of the capture, deterministic for a given seed. The
+    sample is only known at the end of the capture, so the records are
+    chosen in a first pass over the headers.
+    """
+
+    def __init__(self, size, seed=None):
+        self.size = size
+        self.seed = seed
+
+    def select(self, items, keep=None):
+        """
+        Choose the sample of items (reservoir sampling, algorithm R). keep
+        is called for an item at the moment it's chosen and its result is
+        kept instead, items which are never chosen are never kept.
+        """
+
+        rng = random.Random(self.seed)
+        size = self.size
+        chosen = []
+
+        if keep is None:
+            keep = lambda item: item
+
+        for index, item in enumerate(items):
+            if index < size:
+                chosen.append((index, keep(item)))
+                continue
+
+            slot = rng.randint(0, index)
+
+            if slot < size:
+                chosen[slot] = (index, keep(item))
+
+        chosen.sort(key=lambda pair: pair[0])
+
+        return [kept for index, kept in chosen]
@@ -0,0 +1,90 @@
+#
+# Copyright (c) 2015 Alexander Schrijver <alex@flupzor.nl>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+#
+
+"""
+Splitting a capture into smaller captures in one pass.
+"""
+
+import os
+
+from .pcap import PcapFile, RotatingPcapWriter
+
+
+def _default_prefix(path):
+    prefix, extension = os.path.splitext(path)
+
+    # capture.pcap.gz becomes capture.
+    if extension in ('.gz', '.bz2', '.xz'):
+        prefix = os.path.splitext(prefix)[0]
+    elif extension not in ('.pcap', '.cap'):
+        prefix = path
+
+    return prefix
+
+
+def split_capture(src, prefix=None, max_bytes=None, max_duration=None, by=None, **kwargs):
+    """
+    Split the capture at src into captures of at most max_bytes bytes
+    and/or spanning at most max_duration (a timedelta), see
+    RotatingPcapWriter. The records are copied as is.
+
+    by is an optional function which is called with the PcapRecordHeader
+    of every record, records for which it returns different keys are
+    written to different captures, with the key in their name.
+
+    The captures are named <prefix>[-<key>]-<first>-<last>.pcap, the
+    prefix defaults to src without its extensions. Returns the paths of
+    the captures. If copying fails the captures which were being written
+    are left behind as <prefix>[-<key>].partial.
+    """
+
+    if prefix is None:
+        prefix = _default_prefix(src)
+
+    pcap_file = PcapFile.open(src)
+    writers = {}
+
+    kwargs.setdefault('network', pcap_file.network)
+    kwargs.setdefault('snaplen', pcap_file.snaplen)
+
+    try:
+        try:
+            for header, payload in pcap_file.records():
+                key = by(header) if by is not None else None
+                writer = writers.get(key)
+
+                if writer is None:
+                    writer = writers[key] = RotatingPcapWriter(
+                        prefix if key is None else '{0}-{1}'.format(prefix, key),
+                        max_bytes,
+                        max_duration,
+                        **kwargs
+                    )
+
+                writer.write_record(header.ts_sec, header.ts_usec, payload, header.orig_len)
+        except Exception:
+            # Don't make the incomplete captures look complete.
+            for writer in writers.values():
+                writer.abort()
+
+            raise
+
+        for writer in writers.values():
+            writer.close()
+    finally:
+        pcap_file.close()
+
+    return sorted(path for writer in writers.values() for path in writer.paths)
@@ -0,0 +1,133 @@
+#
+# Copyright (c) 2015 Alexander Schrijver <alex@flupzor.nl>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+#
+
+import array
+import os
+import struct
+import unittest
+
+from ..dedup import DuplicateFilter, dedup_frames
+from ..pcap import PcapFile, PcapWriter
+from .test_pcap import CaptureMixin
+
+
+class DedupTests(CaptureMixin, unittest.TestCase):
+
+    def setUp(self):
+        super(DedupTests, self).setUp()
+
+        beacon = self._create_beacon()
+        probe = self._create_radiotap_frame() + self._create_ieee80211_probe_request_frame()
+
+        # The same beacon captured by another interface, with another
+        # antenna signal in the radiotap header.
+        other_interface = beacon[:]
+        other_interface[14] = 0xb0
+
+        with PcapWriter.open(self.path, snaplen=180) as writer:
+            for ts_usec, frame in ((0, beacon), (100, other_interface), (200, probe),
+                                   (300, beacon), (2000000, beacon)):
+                writer.write_record(1 + ts_usec // 1000000, ts_usec % 1000000, frame.tostring())
+
+    def test_dedup_frames(self):
+        pcap_file = PcapFile.open(self.path)
+        frames = list(dedup_frames(pcap_file.frames()))
+
+        self.assertEqual(
+            [(frame.time_recorded.second, frame.time_recorded.microsecond) for frame in frames],
+            [(1, 0), (1, 200), (3, 0)]
+        )
+        self._assert_ieee80211_beacon_frame(frames[0].radiotap_frame.ieee80211_frame)
+
+        pcap_file.close()
+
+    def test_records(self):
+        pcap_file = PcapFile.open(self.path)
+
+        # Including the radiotap header.
+        dedup = DuplicateFilter(skip_radiotap=False)
+        records = list(dedup.records(pcap_file.records()))
+
+        self.assertEqual([header.ts_usec for header, payload in records], [0, 100, 200, 0])
+        self.assertEqual(dedup.duplicates, 1)
+        self.assertEqual(len(dedup.seen), 1)
+
+        # With too few hashes to remember the first beacon.
+        dedup = DuplicateFilter(max_entries=1)
+        records = list(dedup.records(pcap_file.records()))
+
+        self.assertEqual(len(records), 4)
+        self.assertEqual(dedup.duplicates, 1)
+
+        pcap_file.close()
+
+    def test_without_radiotap(self):
+        path = os.path.join(self.directory, 'ieee80211.pcap')
+
+        # Distinct beacons with a Duration of 314 where a radiotap header
+        # would have its length.
+        with PcapWriter.open(path, network=105) as writer:
+            for n in range(5):
+                beacon = self._create_ieee80211_beacon_frame()
+                beacon[2:4] = array.array('B', [0x3a, 0x01])
+                beacon[-1] = n
+                writer.write_record(1, n, beacon.tostring())
+
+        pcap_file = PcapFile.open(path)
+
+        self.assertEqual(len(list(dedup_frames(pcap_file.frames()))), 5)
+        self.assertEqual(len(list(DuplicateFilter().records(pcap_file.records(), 105))), 5)
+
+        pcap_file.close()
+
+    def test_radio_headers(self):
+        beacon = self._create_ieee80211_beacon_frame()
+        other_beacon = beacon[:]
+        other_beacon[-1] ^= 0xff
+        beacon, other_beacon = beacon.tostring(), other_beacon.tostring()
+
+        # The same beacon captured by two interfaces, with another signal
+        # in the AVS header and another length (and field) in the PPI
+        # header, followed by another beacon.
+        headers = {
+            163: [
+                struct.pack('>IIQQIIIIIIiiII', 0x80211001, 64, 0, 0, 0, 6, 20, 0, 0, 1, signal, -95, 0, 0)
+                for signal in (-61, -70, -61)
+            ],
+            192: [
+                struct.pack('<BBHI', 0, 0, 8, 105),
+                struct.pack('<BBHI', 0, 0, 12, 105) + b'\x01\x00\x00\x00',
+                struct.pack('<BBHI', 0, 0, 8, 105),
+            ],
+        }
+
+        for network, (first, second, third) in headers.items():
+            path = os.path.join(self.directory, '{0}.pcap'.format(network))
+
+            with PcapWriter.open(path, network=network) as writer:
+                writer.write_record(1, 0, first + beacon)
+                writer.write_record(1, 100, second + beacon)
+                writer.write_record(1, 200, third + other_beacon)
+
+            pcap_file = PcapFile.open(path)
+
+            frames = list(dedup_frames(pcap_file.frames()))
+            self.assertEqual([frame.time_recorded.microsecond for frame in frames], [0, 200])
+
+            records = list(DuplicateFilter().records(pcap_file.records(), network))
+            self.assertEqual([header.ts_usec for header, payload in records], [0, 200])
+
+            pcap_file.close()
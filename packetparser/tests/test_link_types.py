@@ -0,0 +1,97 @@
+#
+# Copyright (c) 2015 Alexander Schrijver <alex@flupzor.nl>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+#
+
+import os
+import struct
+import unittest
+
+from ..ieee80211 import IEEE80211BeaconFrame
+from ..link_types import AvsFrame, PpiFrame
+from ..pcap import PcapFile, PcapWriter
+from .test_pcap import CaptureMixin
+
+
+class LinkTypeTests(CaptureMixin, unittest.TestCase):
+
+    def setUp(self):
+        super(LinkTypeTests, self).setUp()
+        self.beacon = self._create_ieee80211_beacon_frame().tostring()
+
+    def _frames(self, network, payload, **kwargs):
+        path = os.path.join(self.directory, '{0}.pcap'.format(network))
+
+        with PcapWriter.open(path, network=network) as writer:
+            writer.write_record(1, 0, payload)
+
+        # The frames outlive the mapping of the file.
+        pcap_file = PcapFile.open(path)
+        frames = [frame.copy() for frame in pcap_file.frames(**kwargs)]
+        pcap_file.close()
+
+        return frames
+
+    def test_ieee80211(self):
+        frame, = self._frames(105, self.beacon)
+
+        self._assert_ieee80211_beacon_frame(frame.ieee80211_frame)
+        self.assertFalse(hasattr(frame, 'radiotap_frame'))
+
+    def test_depth(self):
+        path = os.path.join(self.directory, 'depth.pcap')
+
+        with PcapWriter.open(path, network=105) as writer:
+            writer.write_record(1, 0, self.beacon)
+
+        pcap_file = PcapFile.open(path)
+
+        try:
+            frame, = pcap_file.frames(depth='ieee80211_header')
+
+            self.assertIsInstance(frame.ieee80211_frame, IEEE80211BeaconFrame)
+            self.assertFalse(hasattr(frame.ieee80211_frame, 'ssid'))
+
+            copy = frame.copy()
+        finally:
+            pcap_file.close()
+
+        self.assertEqual(copy.depth, 'ieee80211_header')
+        self.assertIsInstance(copy.ieee80211_frame, IEEE80211BeaconFrame)
+        self.assertFalse(hasattr(copy.ieee80211_frame, 'ssid'))
+
+    def test_avs(self):
+        header = struct.pack('>IIQQIIIIIIiiII', 0x80211001, 64, 0, 0, 0, 6, 20, 0, 0, 1, -61, -95, 0, 0)
+
+        frame, = self._frames(163, header + self.beacon)
+
+        self.assertIsInstance(frame.avs_frame, AvsFrame)
+        self.assertEqual(frame.avs_frame.channel, 6)
+        self.assertEqual(frame.avs_frame.ssi_signal, -61)
+        self._assert_ieee80211_beacon_frame(frame.avs_frame.ieee80211_frame)
+
+    def test_ppi(self):
+        header = struct.pack('<BBHI', 0, 0, 8, 105)
+
+        frame, = self._frames(192, header + self.beacon)
+
+        self.assertIsInstance(frame.ppi_frame, PpiFrame)
+        self._assert_ieee80211_beacon_frame(frame.ppi_frame.ieee80211_frame)
+
+    def test_passthrough(self):
+        # Ethernet isn't parsed.
+        frame, = self._frames(1, b'\xff' * 60)
+
+        self.assertEqual(bytearray(frame.payload), b'\xff' * 60)
+        self.assertIsNone(frame.payload_type)
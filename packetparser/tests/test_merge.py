@@ -0,0 +1,69 @@
+#
+# Copyright (c) 2015 Alexander Schrijver <alex@flupzor.nl>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+#
+
+from datetime import timedelta
+import os
+import unittest
+
+from ..merge import merge_captures, write_merged_capture
+from ..pcap import PcapFile, PcapWriter
+from .test_pcap import CaptureMixin
+
+
+class MergeTests(CaptureMixin, unittest.TestCase):
+
+    def setUp(self):
+        super(MergeTests, self).setUp()
+
+        beacon = self._create_beacon().tostring()
+
+        self.paths = []
+
+        # Three sensors, the clock of the second one is a second behind.
+        for sensor, seconds in enumerate(([1, 4, 7], [1, 2, 8], [3, 5, 6])):
+            path = os.path.join(self.directory, '{0}.pcap'.format(sensor))
+
+            with PcapWriter.open(path, snaplen=180) as writer:
+                for second in seconds:
+                    writer.write_record(second, sensor, beacon)
+
+            self.paths.append(path)
+
+        self.clock_offsets = {self.paths[1]: timedelta(seconds=1)}
+
+    def test_merge_captures(self):
+        frames = list(merge_captures(self.paths, self.clock_offsets))
+
+        self.assertEqual(
+            [(frame.time_recorded.second, frame.capture) for frame in frames],
+            [(1, 0), (2, 1), (3, 1), (3, 2), (4, 0), (5, 2), (6, 2), (7, 0), (9, 1)]
+        )
+        self._assert_ieee80211_beacon_frame(frames[-1].radiotap_frame.ieee80211_frame)
+
+    def test_write_merged_capture(self):
+        path = os.path.join(self.directory, 'merged.pcap')
+        write_merged_capture(self.paths, path, [None, timedelta(seconds=1)])
+
+        pcap_file = self._closing(PcapFile.open(path))
+
+        self.assertEqual(pcap_file.snaplen, 180)
+        self.assertEqual(
+            [(frame.time_recorded.second, frame.time_recorded.microsecond)
+             for frame in pcap_file.frames()],
+            [(1, 0), (2, 1), (3, 1), (3, 2), (4, 0), (5, 2), (6, 2), (7, 0), (9, 1)]
+        )
+
+        pcap_file.close()
@@ -15,17 +15,33 @@
 #
 
 from datetime import datetime, timedelta
-from tempfile import TemporaryFile
+from tempfile import TemporaryFile, NamedTemporaryFile
 import array
+import bz2
+import contextlib
+import gzip
+import operator
 import unittest
 import os
-
-from packetparser.pcap import PcapFile
+import random
+import shutil
+import struct
+import tempfile
+import time
+
+from packetparser import sampling
+from packetparser.pcap import PcapFile, PcapWriter
+from packetparser.pcap_index import PcapIndex
 from packetparser.radiotap import RadiotapFrame
 from packetparser.ieee80211 import (
-    IEEE80211Frame, IEEE80211Types, IEEE80211ManagementSubtypes
+    IEEE80211Frame, IEEE80211Types, IEEE80211ManagementSubtypes,
+    IEEE80211BeaconFrame
 )
 
+def frame_second(frame):
+    return frame.time_recorded.second
+
+
 class PcapMixin(object):
     def _create_pcap_header(self):
 
@@ -54,8 +70,9 @@ class PcapMixin(object):
         self.assertEquals(pcap_header.snaplen, 180)
         self.assertEquals(pcap_header.network, 127)
 
-    def _create_pcap_frame(self, incl_len, orig_len=None):
-        ts_sec = [0x01, 0x00, 0x00, 0x00]  # 1970-1-1 00:00:01
+    def _create_pcap_frame(self, incl_len, orig_len=None, ts_sec=None):
+        if not ts_sec:
+            ts_sec = [0x01, 0x00, 0x00, 0x00]  # 1970-1-1 00:00:01
         ts_usec = [0x01, 0x00, 0x00, 0x00]  # + 1 microseconds
 
         incl_len = incl_len
@@ -381,3 +398,635 @@ class ApiTests(IEEE80211Tests, RadiotapMixin, PcapMixin, unittest.TestCase):
 
             pcap_frames = list(pcap_header.frames())
             self.assertEqual(len(pcap_frames), 100)
+
+    def test_pcap_open_mmap(self):
+        with NamedTemporaryFile() as f:
+            pcap_file_array = self._pcap_file_with_beacon_frame() + \
+                self._create_pcap_frame(
+                   incl_len=[0x39, 0x00, 0x00, 0x00]  # 57 bytes
+                ) + \
+                self._create_radiotap_frame() + \
+                self._create_ieee80211_probe_request_frame()
+            f.write(pcap_file_array.tostring())
+            f.flush()
+
+            pcap_file = PcapFile.open_mmap(f.name)
+            self._assert_pcap_header(pcap_file)
+
+            pcap_frames = list(pcap_file.frames())
+            self.assertEqual(len(pcap_frames), 2)
+
+            self._assert_pcap_frame(pcap_frames[0], length=75, orig_length=75)
+            self._assert_radiotap_frame(pcap_frames[0].radiotap_frame)
+            self._assert_ieee80211_beacon_frame(pcap_frames[0].radiotap_frame.ieee80211_frame)
+            self.assertEqual(len(pcap_frames[0].payload), 75)
+
+            self._assert_pcap_frame(pcap_frames[1], length=57, orig_length=57)
+            self._assert_ieee80211_probe_request_frame(pcap_frames[1].radiotap_frame.ieee80211_frame)
+
+            del pcap_frames
+            pcap_file.close()
+
+
+class CaptureMixin(IEEE80211Tests, RadiotapMixin, PcapMixin):
+    """
+    A temporary directory for the captures of a test. With capture_seconds
+    a capture with one beacon frame for every second in it is written to
+    self.path, the frames are recorded 1 microsecond after the second.
+    """
+
+    capture_seconds = None
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'capture.pcap')
+        self.opened = []
+
+        if self.capture_seconds is not None:
+            self._create_capture(self.path, self.capture_seconds)
+
+    def tearDown(self):
+        for opened in self.opened:
+            opened.close()
+
+        shutil.rmtree(self.directory)
+
+    def _closing(self, opened):
+        """
+        Close opened, a capture or a file, in tearDown, also when the test
+        fails before closing it.
+        """
+
+        self.opened.append(opened)
+
+        return opened
+
+    def _create_beacon(self):
+        return self._create_radiotap_frame() + self._create_ieee80211_beacon_frame()
+
+    def _create_capture(self, path, seconds):
+        pcap_file_array = self._create_pcap_header()
+
+        for second in seconds:
+            pcap_file_array += self._create_pcap_frame(
+                incl_len=[0x4b, 0x00, 0x00, 0x00],
+                ts_sec=[second, 0x00, 0x00, 0x00]
+            ) + self._create_beacon()
+
+        with open(path, 'wb') as f:
+            pcap_file_array.tofile(f)
+
+    def _seconds(self, frames):
+        return [frame.time_recorded.second for frame in frames]
+
+
+class IndexTests(CaptureMixin, unittest.TestCase):
+
+    def setUp(self):
+        super(IndexTests, self).setUp()
+
+        pcap_file_array = self._create_pcap_header()
+
+        for incl_len, frame in (
+                (0x4b, self._create_ieee80211_beacon_frame()),
+                (0x39, self._create_ieee80211_probe_request_frame()),
+                (0x4b, self._create_ieee80211_beacon_frame())):
+            pcap_file_array += self._create_pcap_frame(
+                incl_len=[incl_len, 0x00, 0x00, 0x00]
+            ) + self._create_radiotap_frame() + frame
+
+        with open(self.path, 'wb') as f:
+            pcap_file_array.tofile(f)
+
+    def test_random_access(self):
+        for open_pcap in (
+                lambda: self._closing(PcapFile.parse_header(open(self.path, 'rb'))),
+                lambda: self._closing(PcapFile.open_mmap(self.path))):
+            pcap_file = open_pcap()
+
+            self.assertEqual(len(pcap_file), 3)
+
+            self._assert_pcap_frame(pcap_file.frame_at(1), length=57, orig_length=57)
+            self._assert_ieee80211_probe_request_frame(
+                pcap_file[1].radiotap_frame.ieee80211_frame
+            )
+            self._assert_ieee80211_beacon_frame(
+                pcap_file[-1].radiotap_frame.ieee80211_frame
+            )
+            self.assertEqual([f.len for f in pcap_file[1:]], [57, 75])
+
+            with self.assertRaises(IndexError):
+                pcap_file.frame_at(3)
+
+            pcap_file.close()
+
+    def test_sidecar(self):
+        index_path = self.path + '.idx'
+
+        # Random access builds the index, but doesn't write the sidecar.
+        pcap_file = self._closing(PcapFile.parse_header(open(self.path, 'rb')))
+        self.assertEqual(len(pcap_file), 3)
+        pcap_file.frame_at(0)
+        self.assertFalse(os.path.exists(index_path))
+
+        index = pcap_file.build_index()
+        pcap_file.close()
+
+        self.assertTrue(os.path.exists(index_path))
+
+        pcap_file = self._closing(PcapFile.open_mmap(self.path))
+        loaded = pcap_file.load_index()
+        pcap_file.close()
+
+        self.assertEqual(loaded.columns(), index.columns())
+        self.assertEqual(list(loaded.offsets), [24, 24 + 16 + 75, 24 + 2 * 16 + 75 + 57])
+        self.assertEqual(list(loaded.lengths), [75, 57, 75])
+
+    def test_stale_sidecar(self):
+        pcap_file = self._closing(PcapFile.open_mmap(self.path))
+        pcap_file.build_index()
+        pcap_file.close()
+
+        # Rewritten to the same size, the first frame a second later.
+        with open(self.path, 'rb') as f:
+            capture = bytearray(f.read())
+
+        capture[24] += 1
+        mtime = os.path.getmtime(self.path)
+
+        with open(self.path, 'wb') as f:
+            f.write(capture)
+
+        os.utime(self.path, (mtime + 10, mtime + 10))
+
+        pcap_file = self._closing(PcapFile.open_mmap(self.path))
+        self.assertEqual(pcap_file.load_index().ts_sec[0], 2)
+
+        # The stale sidecar is only replaced by build_index.
+        self.assertEqual(PcapIndex.load(self.path + '.idx').ts_sec[0], 1)
+        pcap_file.build_index()
+        self.assertEqual(PcapIndex.load(self.path + '.idx').ts_sec[0], 2)
+
+        # A sidecar which can't be written isn't saved.
+        index_path = os.path.join(self.directory, 'missing', 'capture.pcap.idx')
+        self.assertEqual(len(pcap_file.build_index(index_path)), 3)
+        self.assertFalse(os.path.exists(index_path))
+
+        pcap_file.close()
+
+
+class SeekTests(CaptureMixin, unittest.TestCase):
+
+    capture_seconds = range(1, 41)
+
+    def test_frames_time_range(self):
+        # The frames are recorded 1 microsecond after the second.
+        start = datetime(1970, 1, 1, 0, 0, 10)
+        end = datetime(1970, 1, 1, 0, 0, 14)
+
+        with_index = self._closing(PcapFile.parse_header(open(self.path, 'rb')))
+        with_index.build_index()
+
+        # Bisect the file down to the record.
+        bisected = self._closing(PcapFile.open_mmap(self.path))
+        bisected.seek_window = 0
+
+        stream = self._closing(PcapFile.parse_header(open(self.path, 'rb'), seekable=False))
+
+        for pcap_file in (with_index, bisected, stream):
+            frames = list(pcap_file.frames(start=start, end=end))
+
+            self.assertEqual(self._seconds(frames), [10, 11, 12, 13])
+            self._assert_ieee80211_beacon_frame(frames[0].radiotap_frame.ieee80211_frame)
+
+            pcap_file.close()
+
+    def test_seek_offset(self):
+        pcap_file = self._closing(PcapFile.open_mmap(self.path))
+        pcap_file.seek_window = 0
+
+        record_size = 16 + 75
+
+        self.assertEqual(pcap_file.seek_offset(datetime(1970, 1, 1)), 24)
+        self.assertEqual(
+            pcap_file.seek_offset(datetime(1970, 1, 1, 0, 0, 30, 2)),
+            24 + 30 * record_size
+        )
+        self.assertEqual(
+            pcap_file.seek_offset(datetime(1970, 1, 1, 0, 1)),
+            24 + 40 * record_size
+        )
+        self.assertEqual(list(pcap_file.frames(start=datetime(1970, 1, 1, 0, 1))), [])
+
+        pcap_file.close()
+
+    def test_stream_start(self):
+        path = os.path.join(self.directory, 'stream.pcap')
+
+        # Radiotap headers longer than the records, which fail to parse.
+        with PcapWriter.open(path, snaplen=180) as writer:
+            for second in range(1, 6):
+                writer.write_record(second, 0, b'\x00\x00\xff\xff')
+
+            for second in range(6, 9):
+                writer.write_record(second, 0, self._create_beacon().tostring())
+
+        stream = self._closing(PcapFile.parse_header(open(path, 'rb'), seekable=False))
+        frames = list(stream.frames(start=datetime(1970, 1, 1, 0, 0, 6)))
+
+        self.assertEqual(self._seconds(frames), [6, 7, 8])
+        self._assert_ieee80211_beacon_frame(frames[0].radiotap_frame.ieee80211_frame)
+
+        stream.close()
+
+    def test_seek_zero_payloads(self):
+        path = os.path.join(self.directory, 'zeros.pcap')
+        rng = random.Random(1)
+
+        # Zero-filled payloads look like empty records from the epoch.
+        with PcapWriter.open(path, network=1) as writer:
+            for n in range(3000):
+                writer.write_record(1000 + n, 0, b'\x00' * rng.randint(48, 1500))
+
+        pcap_file = self._closing(PcapFile.open_mmap(path))
+
+        indexed = self._closing(PcapFile.open_mmap(path))
+        index = indexed.build_index()
+        indexed.close()
+
+        for n in (0, 1, 1234, 2999):
+            start = datetime(1970, 1, 1) + timedelta(seconds=1000 + n)
+
+            self.assertEqual(pcap_file.seek_offset(start), index.offsets[n])
+            self.assertEqual(len(list(pcap_file.frames(start=start))), 3000 - n)
+
+        pcap_file.close()
+
+
+class TruncatedFrameTests(CaptureMixin, unittest.TestCase):
+
+    def test_truncated_elements(self):
+        beacon = self._create_beacon().tostring()
+
+        # Cut off in the header and in the body of the TIM element, each
+        # followed by a complete beacon.
+        with PcapWriter.open(self.path, snaplen=180) as writer:
+            for second, length in ((1, 70), (2, 75), (3, 72), (4, 75)):
+                writer.write_record(second, 0, beacon[:length], orig_len=75)
+
+        mapped = self._closing(PcapFile.open_mmap(self.path))
+        stream = self._closing(PcapFile.parse_header(open(self.path, 'rb'), seekable=False))
+
+        for pcap_file in (mapped, stream):
+            frames = [frame.radiotap_frame.ieee80211_frame for frame in pcap_file.frames()]
+
+            for truncated in frames[0::2]:
+                self.assertEqual(truncated.ssid, 'ABCD')
+                self.assertFalse(hasattr(truncated, 'dtim_count'))
+
+            for complete in frames[1::2]:
+                self._assert_ieee80211_beacon_frame(complete)
+
+            pcap_file.close()
+
+    def test_truncated_fixed_fields(self):
+        beacon = self._create_beacon().tostring()
+
+        # Within the fixed fields of the beacon.
+        with PcapWriter.open(self.path, snaplen=180) as writer:
+            writer.write_record(1, 0, beacon[:45], orig_len=75)
+            writer.write_record(2, 0, beacon)
+
+        pcap_file = self._closing(PcapFile.open_mmap(self.path))
+
+        with self.assertRaises(struct.error):
+            list(pcap_file.frames())
+
+        pcap_file.close()
+
+
+class ParallelTests(CaptureMixin, unittest.TestCase):
+
+    capture_seconds = range(1, 41)
+
+    def test_parallel_frames(self):
+        pcap_file = self._closing(PcapFile.parse_header(open(self.path, 'rb')))
+
+        # Both by resynchronizing and with the frame index.
+        for _ in range(2):
+            self.assertEqual(len(pcap_file.chunk_offsets(3)), 3)
+            self.assertEqual(
+                list(pcap_file.parallel_frames(frame_second, workers=2)),
+                list(range(1, 41))
+            )
+            self.assertEqual(
+                pcap_file.reduce_frames(frame_second, operator.add, workers=2, chunks=3),
+                sum(range(1, 41))
+            )
+
+            pcap_file.build_index()
+
+        pcap_file.close()
+
+    def test_header_only(self):
+        path = os.path.join(self.directory, 'empty.pcap')
+        PcapWriter.open(path).close()
+
+        pcap_file = self._closing(PcapFile.open_mmap(path))
+
+        self.assertEqual(pcap_file.chunk_offsets(3), [])
+        self.assertEqual(list(pcap_file.parallel_frames(frame_second, workers=1)), [])
+
+        pcap_file.close()
+
+
+class BlockReaderTests(CaptureMixin, unittest.TestCase):
+
+    capture_seconds = range(1, 41)
+
+    def test_block_reads(self):
+        with open(self.path, 'rb') as f:
+            record = bytearray(f.read())[24:24 + 16 + 75]
+
+        stream = self._closing(PcapFile.parse_header(open(self.path, 'rb'), seekable=False))
+
+        # Smaller than a frame, and frames cross the end of the blocks.
+        stream.block_size = 50
+
+        frames = [frame.copy() for frame in stream.frames()]
+
+        self.assertEqual(self._seconds(frames), list(range(1, 41)))
+        self.assertEqual(frames[0].payload, record[16:])
+        self._assert_ieee80211_beacon_frame(frames[0].radiotap_frame.ieee80211_frame)
+
+        stream.close()
+
+
+class WriterTests(CaptureMixin, unittest.TestCase):
+
+    capture_seconds = range(1, 41)
+
+    def test_writer(self):
+        path = os.path.join(self.directory, 'written.pcap')
+        start = datetime(1970, 1, 1, 0, 0, 10)
+        end = datetime(1970, 1, 1, 0, 0, 14)
+
+        with open(self.path, 'rb') as f:
+            original = f.read()
+
+        payload = original[24 + 16:24 + 16 + 75]
+
+        pcap_file = self._closing(PcapFile.open_mmap(self.path))
+
+        # A buffer smaller than the capture, which is flushed in between.
+        with PcapWriter.open(path, snaplen=180, buffer_size=256,
+                             fsync=PcapWriter.FSYNC_CLOSE) as writer:
+            writer.write_frames(pcap_file.frames(start=start, end=end))
+            writer.write_record(50, 1, payload, orig_len=200)
+
+        with open(path, 'rb') as f:
+            written = f.read()
+
+        record_size = 16 + 75
+
+        self.assertEqual(written[:24], original[:24])
+        self.assertEqual(
+            written[24:24 + 4 * record_size],
+            original[24 + 9 * record_size:24 + 13 * record_size]
+        )
+
+        frames = list(self._closing(PcapFile.open_mmap(path)).frames())
+
+        self.assertEqual(self._seconds(frames), [10, 11, 12, 13, 50])
+        self.assertEqual((frames[-1].len, frames[-1].orig_len), (75, 200))
+        self.assertEqual(frames[0].to_buffer(), written[24:24 + record_size])
+
+        # Frames read without their payload can't be written.
+        with PcapWriter.open(path) as writer:
+            with self.assertRaises(ValueError):
+                writer.write_frame(next(pcap_file.frames(depth='pcap')))
+
+        pcap_file.close()
+
+
+class CompressedTests(CaptureMixin, unittest.TestCase):
+
+    capture_seconds = range(1, 41)
+
+    def test_open_compressed(self):
+        with open(self.path, 'rb') as f:
+            original = f.read()
+
+        compressed_path = os.path.join(self.directory, 'capture.pcap.compressed')
+
+        for compressor in (gzip.GzipFile, bz2.BZ2File):
+            with contextlib.closing(compressor(compressed_path, 'wb')) as f:
+                f.write(original)
+
+            pcap_file = self._closing(PcapFile.open(compressed_path))
+
+            self.assertFalse(pcap_file.seekable)
+            self.assertEqual(pcap_file.snaplen, 180)
+            self.assertEqual(self._seconds(pcap_file.frames()), list(range(1, 41)))
+
+            # The frames of streams can't be indexed.
+            for random_access in (len, lambda f: f[0], lambda f: f.chunk_offsets(3),
+                                  lambda f: f.build_index()):
+                with self.assertRaises(ValueError):
+                    random_access(pcap_file)
+
+            pcap_file.close()
+
+        pcap_file = self._closing(PcapFile.open(self.path))
+        self.assertIsNotNone(pcap_file.mapping)
+        pcap_file.close()
+
+
+class FollowTests(CaptureMixin, unittest.TestCase):
+
+    capture_seconds = range(1, 41)
+
+    def test_follow(self):
+        with open(self.path, 'rb') as f:
+            original = f.read()
+
+        record_size = 16 + 75
+
+        # A capture which is being written, the second record partially.
+        growing = self._closing(open(self.path, 'wb'))
+        growing.write(original[:24 + record_size + 10])
+        growing.flush()
+
+        pcap_file = self._closing(PcapFile.parse_header(open(self.path, 'rb')))
+        frames = pcap_file.follow(poll_interval=0.01, idle_timeout=0.1)
+
+        self.assertEqual(next(frames).time_recorded.second, 1)
+
+        growing.write(original[24 + record_size + 10:24 + 2 * record_size])
+        growing.flush()
+
+        frame = next(frames)
+        self.assertEqual(frame.time_recorded.second, 2)
+        self.assertTrue(frame.lag > timedelta(days=365))
+        self._assert_ieee80211_beacon_frame(frame.radiotap_frame.ieee80211_frame)
+
+        # Idle for at least idle_timeout, however long the polls take.
+        started = time.time()
+        self.assertEqual(list(frames), [])
+        self.assertTrue(time.time() - started >= 0.1)
+
+        growing.close()
+        pcap_file.close()
+
+
+class DepthTests(CaptureMixin, unittest.TestCase):
+
+    capture_seconds = range(1, 41)
+
+    def test_depth(self):
+        pcap_file = self._closing(PcapFile.open_mmap(self.path))
+
+        frames = list(pcap_file.frames(depth='pcap'))
+        self.assertEqual(self._seconds(frames), list(range(1, 41)))
+        self.assertIsNone(frames[0].payload)
+        self.assertFalse(hasattr(frames[0], 'radiotap_frame'))
+
+        frame = next(pcap_file.frames(depth='radiotap'))
+        self.assertIsInstance(frame.radiotap_frame, RadiotapFrame)
+        self.assertIsNone(frame.radiotap_frame.ieee80211_frame)
+
+        ieee80211_frame = next(pcap_file.frames(depth='ieee80211_header')).radiotap_frame.ieee80211_frame
+        self.assertIsInstance(ieee80211_frame, IEEE80211BeaconFrame)
+        self.assertEqual(ieee80211_frame.seq, 1)
+        self.assertFalse(hasattr(ieee80211_frame, 'ssid'))
+
+        with self.assertRaises(ValueError):
+            next(pcap_file.frames(depth='radio'))
+
+        pcap_file.close()
+
+
+class SummaryTests(CaptureMixin, unittest.TestCase):
+
+    capture_seconds = range(1, 41)
+
+    def test_summary(self):
+        expected = {
+            'frames': 40,
+            'bytes': 40 * 75,
+            'first': datetime(1970, 1, 1, 0, 0, 1, 1),
+            'last': datetime(1970, 1, 1, 0, 0, 40, 1),
+        }
+
+        stream = self._closing(PcapFile.parse_header(open(self.path, 'rb'), seekable=False))
+        stream.block_size = 50
+        self.assertEqual(stream.summary(), expected)
+        stream.close()
+
+        pcap_file = self._closing(PcapFile.parse_header(open(self.path, 'rb')))
+        self.assertEqual(pcap_file.summary(), expected)
+
+        pcap_file.build_index()
+        self.assertEqual(pcap_file.summary(), expected)
+        pcap_file.close()
+
+
+class WhereTests(CaptureMixin, unittest.TestCase):
+
+    capture_seconds = range(1, 41)
+
+    def test_where(self):
+        pcap_file = self._closing(PcapFile.parse_header(open(self.path, 'rb'), seekable=False))
+        pcap_file.block_size = 100
+
+        frames = list(pcap_file.frames(where=lambda header: header.ts_sec % 10 == 0))
+
+        self.assertEqual(self._seconds(frames), [10, 20, 30, 40])
+        self._assert_ieee80211_beacon_frame(frames[-1].radiotap_frame.ieee80211_frame)
+
+        pcap_file.close()
+
+        pcap_file = self._closing(PcapFile.open_mmap(self.path))
+        self.assertEqual(list(pcap_file.frames(where=lambda header: header.incl_len < 75)), [])
+        pcap_file.close()
+
+    def test_where_end(self):
+        pcap_file = self._closing(PcapFile.open_mmap(self.path))
+        seen = []
+
+        def where(header):
+            seen.append(header.ts_sec)
+            return header.ts_sec < 5
+
+        frames = pcap_file.frames(end=datetime(1970, 1, 1, 0, 0, 10, 1), where=where)
+
+        # The headers after end aren't scanned.
+        self.assertEqual(self._seconds(frames), [1, 2, 3, 4])
+        self.assertEqual(seen, list(range(1, 11)))
+
+        pcap_file.close()
+
+
+class SampleTests(CaptureMixin, unittest.TestCase):
+
+    capture_seconds = range(1, 41)
+
+    def test_sample(self):
+        mapped = self._closing(PcapFile.open_mmap(self.path))
+        unmapped = self._closing(PcapFile.parse_header(open(self.path, 'rb')))
+
+        def stream():
+            stream = self._closing(PcapFile.parse_header(open(self.path, 'rb'), seekable=False))
+            stream.block_size = 100
+            return stream
+
+        self.assertEqual(
+            self._seconds(mapped.frames(sample=sampling.EveryNth(10))), [1, 11, 21, 31]
+        )
+        self.assertEqual(
+            self._seconds(stream().frames(sample=sampling.EveryNth(10, phase=9))), [10, 20, 30, 40]
+        )
+
+        bernoulli = self._seconds(mapped.frames(sample=sampling.Bernoulli(0.5, seed=1)))
+        self.assertTrue(10 < len(bernoulli) < 30)
+        self.assertEqual(
+            self._seconds(stream().frames(sample=sampling.Bernoulli(0.5, seed=1))), bernoulli
+        )
+
+        reservoir = sampling.Reservoir(5, seed=3)
+        frames = list(mapped.frames(sample=reservoir, where=lambda header: header.ts_sec % 2 == 0))
+        seconds = self._seconds(frames)
+
+        self.assertEqual(len(seconds), 5)
+        self.assertEqual(seconds, sorted(seconds))
+        self.assertTrue(all(second % 2 == 0 for second in seconds))
+        self._assert_ieee80211_beacon_frame(frames[0].radiotap_frame.ieee80211_frame)
+
+        for pcap_file in (unmapped, stream()):
+            self.assertEqual(
+                self._seconds(pcap_file.frames(sample=reservoir, where=lambda header: header.ts_sec % 2 == 0)),
+                seconds
+            )
+
+        start = datetime(1970, 1, 1, 0, 0, 30)
+        self.assertEqual(
+            self._seconds(mapped.frames(start=start, sample=sampling.Reservoir(20))),
+            list(range(30, 41))
+        )
+
+        mapped.close()
+        unmapped.close()
+
+    def test_sample_start(self):
+        start = datetime(1970, 1, 1, 0, 0, 15)
+        mapped = self._closing(PcapFile.open_mmap(self.path))
+        stream = self._closing(PcapFile.parse_header(open(self.path, 'rb'), seekable=False))
+
+        # Only the records from start on are sampled.
+        for pcap_file in (mapped, stream):
+            self.assertEqual(
+                self._seconds(pcap_file.frames(start=start, sample=sampling.EveryNth(10))),
+                [15, 25, 35]
+            )
+
+            pcap_file.close()
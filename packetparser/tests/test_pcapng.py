@@ -0,0 +1,176 @@
+#
+# Copyright (c) 2015 Alexander Schrijver <alex@flupzor.nl>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+#
+
+from datetime import datetime
+import gzip
+import os
+import shutil
+import struct
+import unittest
+
+from ..pcap import PcapFile
+from ..pcapng import PcapngFile, PcapngWriter
+from ..sampling import EveryNth, Reservoir
+from .test_pcap import CaptureMixin
+
+
+class PcapngTests(CaptureMixin, unittest.TestCase):
+
+    def setUp(self):
+        super(PcapngTests, self).setUp()
+        self.path = os.path.join(self.directory, 'capture.pcapng')
+
+        self.beacon = self._create_beacon().tostring()
+
+    def test_write_read(self):
+        with PcapngWriter.open(self.path, snaplen=180, buffer_size=128) as writer:
+            ethernet = writer.add_interface(1, 100)
+
+            for second in range(1, 4):
+                writer.write_record(second, 5, self.beacon)
+
+            writer.write_record(4, 0, b'\xff' * 150, interface_id=ethernet)
+
+        mapped = PcapngFile.open_mmap(self.path)
+        stream = PcapngFile.parse_header(open(self.path, 'rb'), seekable=False)
+        stream.stream_reader.block_size = 64
+
+        for pcapng_file in (mapped, stream):
+            frames = list(pcapng_file.frames())
+
+            self.assertEqual(pcapng_file.version_major, 1)
+            self.assertEqual([f.interface_id for f in frames], [0, 0, 0, 1])
+            self.assertEqual([f.link_type for f in frames], [127, 127, 127, 1])
+            self.assertEqual(frames[1].time_recorded, datetime(1970, 1, 1, 0, 0, 2, 5))
+            self._assert_ieee80211_beacon_frame(frames[2].radiotap_frame.ieee80211_frame)
+
+            self.assertEqual((frames[3].len, frames[3].orig_len), (100, 150))
+            self.assertEqual(bytearray(frames[3].payload), b'\xff' * 100)
+
+            pcapng_file.close()
+
+    def test_big_endian_timestamp_resolution(self):
+        def block(block_type, body):
+            length = 12 + len(body)
+            return struct.pack('>II', block_type, length) + body + struct.pack('>I', length)
+
+        # Nanosecond timestamps, with the if_tsresol option.
+        options = struct.pack('>HHB3x', 9, 1, 9) + struct.pack('>HH', 0, 0)
+        timestamp = 2 * 10 ** 9 + 123456789
+
+        with open(self.path, 'wb') as f:
+            f.write(block(0x0a0d0d0a, struct.pack('>IHHq', 0x1a2b3c4d, 1, 0, -1)))
+            f.write(block(1, struct.pack('>HHI', 127, 0, 0) + options))
+            f.write(block(6, struct.pack(
+                '>IIIII', 0, timestamp >> 32, timestamp & 0xffffffff, 75, 75
+            ) + self.beacon + b'\x00'))
+
+        pcapng_file = PcapngFile.parse_header(open(self.path, 'rb'))
+        frames = list(pcapng_file.frames())
+
+        self.assertEqual(pcapng_file.byte_order, '>')
+        self.assertEqual(pcapng_file.interfaces[0].resolution, 10 ** 9)
+        self.assertEqual(frames[0].time_recorded, datetime(1970, 1, 1, 0, 0, 2, 123456))
+        self._assert_ieee80211_beacon_frame(frames[0].radiotap_frame.ieee80211_frame)
+
+        pcapng_file.close()
+
+    def test_invalid_block_length(self):
+        section_header = struct.pack('<IIIHHqI', 0x0a0d0d0a, 28, 0x1a2b3c4d, 1, 0, -1, 28)
+
+        for total_length in (0, 8, 14):
+            with open(self.path, 'wb') as f:
+                f.write(section_header + struct.pack('<III', 0x99, total_length, total_length))
+
+            pcapng_file = PcapngFile.open_mmap(self.path)
+
+            with self.assertRaises(ValueError):
+                list(pcapng_file.frames())
+
+            pcapng_file.close()
+
+    def test_frames_arguments(self):
+        with PcapngWriter.open(self.path, snaplen=180) as writer:
+            for second in range(1, 6):
+                writer.write_record(second, 0, self.beacon)
+
+        mapped = PcapngFile.open_mmap(self.path)
+        stream = PcapngFile.parse_header(open(self.path, 'rb'))
+        stream.block_size = 64
+
+        for pcapng_file in (mapped, stream):
+            frames = list(pcapng_file.frames(depth='pcap'))
+            self.assertEqual(self._seconds(frames), [1, 2, 3, 4, 5])
+            self.assertIsNone(frames[0].payload)
+            self.assertFalse(hasattr(frames[0], 'radiotap_frame'))
+
+            frame = next(pcapng_file.frames(depth='radiotap'))
+            self.assertIsNone(frame.radiotap_frame.ieee80211_frame)
+
+            frames = pcapng_file.frames(
+                start=datetime(1970, 1, 1, 0, 0, 2),
+                end=datetime(1970, 1, 1, 0, 0, 4),
+                where=lambda header: header.ts_sec != 3
+            )
+            self.assertEqual(self._seconds(frames), [2, 4])
+
+            frames = pcapng_file.frames(sample=EveryNth(2))
+            self.assertEqual(self._seconds(frames), [1, 3, 5])
+
+            frames = list(pcapng_file.frames(sample=Reservoir(2, seed=1)))
+            self.assertEqual(len(frames), 2)
+            self.assertEqual(self._seconds(frames), sorted(self._seconds(frames)))
+            self._assert_ieee80211_beacon_frame(frames[0].radiotap_frame.ieee80211_frame)
+
+            with self.assertRaises(ValueError):
+                list(pcapng_file.frames(depth='unknown'))
+
+            pcapng_file.close()
+
+    def test_pcap_file_open(self):
+        with PcapngWriter.open(self.path) as writer:
+            writer.write_record(1, 0, self.beacon)
+
+        compressed_path = self.path + '.gz'
+
+        with open(self.path, 'rb') as f, gzip.open(compressed_path, 'wb') as compressed:
+            shutil.copyfileobj(f, compressed)
+
+        for path in (self.path, compressed_path):
+            pcapng_file = PcapFile.open(path)
+
+            self.assertIsInstance(pcapng_file, PcapngFile)
+            frame, = pcapng_file.frames()
+            self._assert_ieee80211_beacon_frame(frame.radiotap_frame.ieee80211_frame)
+
+            pcapng_file.close()
+
+    def test_captured_len_beyond_block(self):
+        section_header = struct.pack('<IIIHHqI', 0x0a0d0d0a, 28, 0x1a2b3c4d, 1, 0, -1, 28)
+        interface = struct.pack('<IIHHII', 1, 20, 127, 0, 0, 20)
+        body = struct.pack('<IIIII', 0, 0, 1, 1000, 1000) + self.beacon + b'\x00'
+
+        with open(self.path, 'wb') as f:
+            f.write(section_header + interface)
+            f.write(struct.pack('<II', 6, 12 + len(body)) + body + struct.pack('<I', 12 + len(body)))
+
+        pcapng_file = PcapngFile.open_mmap(self.path)
+        frame, = pcapng_file.frames()
+
+        self.assertEqual((frame.len, frame.orig_len), (76, 1000))
+        self._assert_ieee80211_beacon_frame(frame.radiotap_frame.ieee80211_frame)
+
+        pcapng_file.close()
@@ -54,7 +54,33 @@ class RadioTapTests(unittest.TestCase):
         Create a Radiotap frame which requires padding between fields
         """
 
-        pass
+        version = [0x00, ]
+        padding = [0x00, ]
+        header_length = [0x0e, 0x00]  # 14 bytes
+        bitmap = [0x0a, 0x00, 0x00, 0x00]  # Enabled: Flags, Channel
+
+        flags = [0x10, ]  # includes fcs
+        channel_padding = [0x00, ]
+        channel = [0x6c, 0x09, 0xa0, 0x00]  # 2412 MHz, cck, 2 GHz
+
+        frame = version + padding + header_length + bitmap + flags + \
+            channel_padding + channel
+
+        frame_array = array.array('B', frame)
+
+        radiotap_frame = RadiotapFrame.parse(frame_array, {'depth': 'radiotap'})
+
+        self.assertTrue(radiotap_frame.data['with_includes_fcs'])
+        self.assertEqual(radiotap_frame.data['frequency'], 2412)
+        self.assertTrue(radiotap_frame.data['cck_channel'])
+        self.assertTrue(radiotap_frame.data['band_2ghz'])
+
+        # The layout is compiled once per tuple of present bitmaps.
+        layout = RadiotapFrame.layouts[(0x0a, )]
+        self.assertEqual(layout.size, 14)
+
+        RadiotapFrame.parse(frame_array, {'depth': 'radiotap'})
+        self.assertIs(RadiotapFrame.layouts[(0x0a, )], layout)
 
     def test_unsupported_fields(self):
         """
@@ -0,0 +1,85 @@
+#
+# Copyright (c) 2015 Alexander Schrijver <alex@flupzor.nl>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+#
+
+from datetime import timedelta
+import os
+import unittest
+
+from ..pcap import PcapFile, PcapWriter
+from ..split import split_capture
+from .test_pcap import CaptureMixin
+
+
+class SplitTests(CaptureMixin, unittest.TestCase):
+
+    def setUp(self):
+        super(SplitTests, self).setUp()
+
+        beacon = self._create_beacon().tostring()
+
+        with PcapWriter.open(self.path, snaplen=180) as writer:
+            for second in range(1, 11):
+                writer.write_record(second, 0, beacon)
+
+    def _seconds(self, path):
+        pcap_file = self._closing(PcapFile.open(path))
+        seconds = [frame.time_recorded.second for frame in pcap_file.frames()]
+        pcap_file.close()
+
+        return seconds
+
+    def test_max_bytes(self):
+        # The header and three records of 16 + 75 bytes.
+        paths = split_capture(self.path, max_bytes=24 + 3 * 91)
+
+        self.assertEqual(
+            [os.path.basename(path) for path in paths],
+            [
+                'capture-19700101T000001.000000-19700101T000003.000000.pcap',
+                'capture-19700101T000004.000000-19700101T000006.000000.pcap',
+                'capture-19700101T000007.000000-19700101T000009.000000.pcap',
+                'capture-19700101T000010.000000-19700101T000010.000000.pcap',
+            ]
+        )
+        self.assertEqual(os.path.getsize(paths[0]), 24 + 3 * 91)
+        self.assertEqual(self._seconds(paths[1]), [4, 5, 6])
+
+    def test_max_duration_by(self):
+        paths = split_capture(
+            self.path,
+            max_duration=timedelta(seconds=4),
+            by=lambda header: 'odd' if header.ts_sec % 2 else 'even'
+        )
+
+        self.assertEqual(
+            [self._seconds(path) for path in paths],
+            [[2, 4], [6, 8], [10], [1, 3], [5, 7], [9]]
+        )
+        self.assertTrue(os.path.basename(paths[0]).startswith('capture-even-'))
+
+    def test_failed_copy(self):
+        def by(header):
+            if header.ts_sec == 5:
+                raise RuntimeError("failed")
+
+        with self.assertRaises(RuntimeError):
+            split_capture(self.path, max_bytes=24 + 3 * 91, by=by)
+
+        self.assertEqual(sorted(os.listdir(self.directory)), [
+            'capture-19700101T000001.000000-19700101T000003.000000.pcap',
+            'capture.partial',
+            'capture.pcap',
+        ])
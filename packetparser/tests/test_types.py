@@ -1,9 +1,15 @@
 import array
+import pickle
 import unittest
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from packetparser.types import (
     Structure, UInt32, UInt16, UInt8, Int32,
-    Int16, Int8, LittleEndian, BigEndian, Array
+    Int16, Int8, LittleEndian, BigEndian, Array, Computed, BitField, Flags
 )
 
 
@@ -137,3 +143,267 @@ class StructureTests(unittest.TestCase):
         self.assertEquals(dummystruct.int32_array, [-1, -1, -1, -1])
         self.assertEquals(dummystruct.int16_array, [-2, -2, -2, -2])
         self.assertEquals(dummystruct.int8_array, [-3, -3, -3, -3])
+
+
+class ConvertedDummyStructure(Structure):
+    endianness = LittleEndian
+
+    attribute_list = (
+        ('value', UInt16),
+        ('array', Array(UInt8, 2)),
+    )
+
+    @classmethod
+    def keys(cls):
+        return ('doubled', 'total')
+
+    @classmethod
+    def to_python(cls, data):
+        return {
+            'doubled': data['value'] * 2,
+            'total': sum(data['array']),
+        }
+
+
+class CompiledUnpackTests(unittest.TestCase):
+
+    def test_to_python_is_applied(self):
+        dummy_data_array = array.array('B', [0x02, 0x01, 0x03, 0x04])
+
+        dummystruct = ConvertedDummyStructure.unpack(dummy_data_array)
+
+        self.assertEquals(dummystruct.doubled, 0x0102 * 2)
+        self.assertEquals(dummystruct.total, 7)
+        self.assertEquals(dummystruct.data, {'doubled': 0x0102 * 2, 'total': 7})
+        self.assertFalse(hasattr(dummystruct, 'value'))
+
+
+class KeysContractTests(unittest.TestCase):
+
+    def test_to_python_without_keys(self):
+        with self.assertRaises(TypeError):
+            class UndeclaredKeysStructure(Structure):
+                attribute_list = (
+                    ('value', UInt16),
+                )
+
+                @classmethod
+                def to_python(cls, data):
+                    return {'doubled': data['value'] * 2}
+
+    def test_to_python_with_other_keys(self):
+        class ExtraKeysStructure(ConvertedDummyStructure):
+            @classmethod
+            def to_python(cls, data):
+                new = super(ExtraKeysStructure, cls).to_python(data)
+                new['extra'] = 1
+
+                return new
+
+        dummy_data_array = array.array('B', [0x02, 0x01, 0x03, 0x04])
+
+        with self.assertRaises(TypeError):
+            ExtraKeysStructure.unpack(dummy_data_array)
+
+
+class RecordTests(unittest.TestCase):
+
+    def _unpack(self):
+        dummy_data_array = array.array('B', [0x02, 0x01, 0x03, 0x04])
+
+        return ConvertedDummyStructure.unpack(dummy_data_array)
+
+    def test_no_instance_dict(self):
+        dummystruct = self._unpack()
+
+        self.assertIsInstance(dummystruct, ConvertedDummyStructure)
+        self.assertFalse(hasattr(dummystruct, '__dict__'))
+
+        with self.assertRaises(AttributeError):
+            dummystruct.unknown = 1
+
+    def test_data_view(self):
+        dummystruct = self._unpack()
+        data = dummystruct.data
+
+        self.assertEquals(sorted(data.keys()), ['doubled', 'total'])
+        self.assertEquals(data.get('unknown'), None)
+
+        data['total'] = 8
+        self.assertEquals(dummystruct.total, 8)
+
+    def test_pickle(self):
+        dummystruct = self._unpack()
+
+        unpickled = pickle.loads(pickle.dumps(dummystruct))
+
+        self.assertIsInstance(unpickled, ConvertedDummyStructure)
+        self.assertEquals(unpickled.data, dummystruct.data)
+
+
+class BatchUnpackTests(unittest.TestCase):
+
+    def _dummy_data_array(self):
+        return array.array('B', [
+            0xff,                    # Not part of the instances.
+            0x01, 0x00, 0x01, 0x02,
+            0x02, 0x00, 0x03, 0x04,
+            0x03, 0x00, 0x05, 0x06,
+        ])
+
+    def test_unpack_many(self):
+        dummystructs = ConvertedDummyStructure.unpack_many(
+            self._dummy_data_array(), 3, offset=1
+        )
+
+        self.assertEquals([d.doubled for d in dummystructs], [2, 4, 6])
+        self.assertEquals([d.total for d in dummystructs], [3, 7, 11])
+
+    def test_unpack_many_columns(self):
+        columns = ConvertedDummyStructure.unpack_many(
+            self._dummy_data_array(), 3, offset=1, columns=True
+        )
+
+        self.assertEquals(columns, ((1, 2, 3), (1, 3, 5), (2, 4, 6)))
+
+    def test_iter_unpack(self):
+        dummystructs = list(ConvertedDummyStructure.iter_unpack(
+            self._dummy_data_array() + array.array('B', [0x00, 0x00]),
+            offset=1
+        ))
+
+        self.assertEquals([d.doubled for d in dummystructs], [2, 4, 6])
+
+
+computed_totals = []
+
+
+def compute_total(array):
+    computed_totals.append(array)
+
+    return sum(array)
+
+
+class LazyDummyStructure(Structure):
+    endianness = LittleEndian
+    lazy = True
+
+    attribute_list = (
+        ('value', UInt16),
+        ('array', Array(UInt8, 2)),
+    )
+
+    python_attribute_list = (
+        ('value', 'value'),
+        ('total', Computed(compute_total, 'array')),
+    )
+
+
+class LazyTests(unittest.TestCase):
+
+    def setUp(self):
+        del computed_totals[:]
+
+    def test_computed_on_access(self):
+        dummy_data_array = array.array('B', [0x02, 0x01, 0x03, 0x04])
+
+        dummystruct = LazyDummyStructure.unpack(dummy_data_array)
+
+        self.assertEquals(dummystruct.value, 0x0102)
+        self.assertEquals(computed_totals, [])
+
+        self.assertEquals(dummystruct.total, 7)
+        self.assertEquals(dummystruct.total, 7)
+        self.assertEquals(computed_totals, [[3, 4]])
+
+    def test_data_view(self):
+        dummy_data_array = array.array('B', [0x02, 0x01, 0x03, 0x04])
+
+        dummystruct = LazyDummyStructure.unpack(dummy_data_array)
+
+        self.assertEquals(dummystruct.data['value'], 0x0102)
+        self.assertEquals(computed_totals, [])
+        self.assertEquals(dict(dummystruct.data), {'value': 0x0102, 'total': 7})
+
+    def test_instantiate(self):
+        dummystruct = LazyDummyStructure({'value': 1, 'total': 2})
+
+        self.assertEquals(dummystruct.total, 2)
+        self.assertEquals(LazyDummyStructure.to_python({'value': 1, 'array': [1, 2]}), {
+            'value': 1,
+            'total': 3,
+        })
+
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class NumpyTests(unittest.TestCase):
+
+    def test_numpy_dtype(self):
+        dtype = ConvertedDummyStructure.numpy_dtype()
+
+        self.assertEquals(dtype.itemsize, ConvertedDummyStructure.size())
+        self.assertEquals(dtype.names, ('value', 'array'))
+        self.assertEquals(dtype['value'], numpy.dtype('<u2'))
+        self.assertEquals(dtype['array'].shape, (2, ))
+
+    def test_unpack_array(self):
+        dummy_data_array = array.array('B', [
+            0x01, 0x00, 0x01, 0x02,
+            0xff,
+            0x02, 0x00, 0x03, 0x04,
+        ])
+
+        records = ConvertedDummyStructure.unpack_array(dummy_data_array, [5, 0])
+
+        self.assertEquals(records['value'].tolist(), [2, 1])
+        self.assertEquals(records['array'].tolist(), [[3, 4], [1, 2]])
+
+
+class BitFieldDummyStructure(Structure):
+    endianness = LittleEndian
+
+    attribute_list = (
+        ('fields', BitField(UInt8, (
+            ('low', 0x0f),
+            ('high', 0xf0),
+        ))),
+        ('flags', Flags(UInt16, (
+            ('first', 0x0001),
+            ('last', 0x8000),
+            ('both', 0x8001),
+        ))),
+    )
+
+
+class LazyBitFieldDummyStructure(BitFieldDummyStructure):
+    lazy = True
+
+
+class BitFieldTests(unittest.TestCase):
+
+    def test_unpack(self):
+        dummy_data_array = array.array('B', [0x21, 0x00, 0x80])
+
+        for cls in (BitFieldDummyStructure, LazyBitFieldDummyStructure):
+            dummystruct = cls.unpack(dummy_data_array)
+
+            self.assertEquals(sorted(cls.keys()), ['both', 'first', 'high', 'last', 'low'])
+            self.assertEquals(dummystruct.low, 0x01)
+            self.assertEquals(dummystruct.high, 0x20)
+            self.assertEquals(dummystruct.first, False)
+            self.assertEquals(dummystruct.last, True)
+            self.assertEquals(dummystruct.both, False)
+
+    def test_pack(self):
+        dummystruct = BitFieldDummyStructure({
+            'low': 0x01,
+            'high': 0x20,
+            'first': True,
+            'last': True,
+            'both': True,
+        })
+
+        dummy_data_array = array.array('B', [0x00, ] * 3)
+        dummystruct.pack(dummy_data_array)
+
+        self.assertEquals(dummy_data_array, array.array('B', [0x21, 0x01, 0x80]))
@@ -22,69 +22,379 @@ the structure definitions human-readable.
 import logging
 import struct
 
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 logger = logging.getLogger(__name__)
 
+# The maximum number of instances unpacked at once by Structure.iter_unpack.
+ITER_UNPACK_COUNT = 64
+
 
 class StructMetaClass(type):
     """
         A Metaclass which processes the format string to a struct on class initialization.
     """
 
+    def __new__(mcs, name, bases, dct):
+        # Structures don't carry a __dict__, the attributes of an instance
+        # are stored in the slots of the record class generated below.
+        dct.setdefault('__slots__', ())
+
+        return super(StructMetaClass, mcs).__new__(mcs, name, bases, dct)
+
     def __init__(cls, name, bases, dct):
         logger.debug("Initializing StructMetaClass: %s", name)
 
+        if dct.get('_is_record'):
+            super(StructMetaClass, cls).__init__(name, bases, dct)
+            return
+
         has_attribute_list = hasattr(cls, 'attribute_list') and not cls.attribute_list is None
 
         if has_attribute_list:
             # Initialize a struct class with the type definition defined in the class
             # which will be used to unpack the data.
-            struct_fmt = cls.endianness.format_char
+            format_chars = ''
 
             for attr, attr_cls in cls.attribute_list:
                 if isinstance(attr_cls, Array):
-                    struct_fmt += attr_cls.format_chars
+                    format_chars += attr_cls.format_chars
                 else:
-                    struct_fmt += attr_cls.format_char
-
-            cls.struct = struct.Struct(struct_fmt)
+                    format_chars += attr_cls.format_char
 
-            initial_data = []
-            initial_data_array = []
-
-            array_mapping = []
-            field_mapping = []
-
-            field_idx = 0
-            data_idx = 0
-            for attr, attr_cls in cls.attribute_list:
-                if isinstance(attr_cls, Array):
-                    initial_data.append(attr)
-                    initial_data_array.append((attr, attr_cls.size))
+            cls.struct = struct.Struct(cls.endianness.format_char + format_chars)
+            cls._struct_size = cls.struct.size
+            cls._format_chars = format_chars
+            cls._value_count = len(format_chars)
 
-                    for array_idx in range(attr_cls.size):
-                        array_mapping.append((attr, array_idx, data_idx))
-                        data_idx += 1
+            cls._python_attributes = cls._collect_python_attributes()
 
-                else:
-                    initial_data.append(attr)
-                    field_mapping.append((attr, data_idx))
+            # The record class has a slot for every key, those of a custom
+            # to_python can't be derived from attribute_list.
+            if _is_overridden(cls, 'to_python') and not _is_overridden(cls, 'keys'):
+                raise TypeError(
+                    "{0} overrides to_python, but not keys".format(name)
+                )
 
-                    data_idx += 1
+            cls._record_class = cls._create_record_class()
 
-                field_idx += 1
+            unpack, build = cls._compile_unpack()
 
-            cls._initial_data = initial_data
-            cls._initial_data_array = initial_data_array
-            cls._array_mapping = array_mapping
-            cls._field_mapping = field_mapping
+            if 'unpack' not in dct:
+                cls.unpack = staticmethod(unpack)
 
-            cls._struct_size = cls.struct.size
+            cls._build = staticmethod(build)
 
         if has_attribute_list and hasattr(cls, 'Meta') and cls.Meta.abstract is False:
             print("{0} has no attribute_list defined".format(name))
 
         super(StructMetaClass, cls).__init__(name, bases, dct)
 
+    def _create_record_class(cls):
+        """
+        Create the subclass whose instances are returned when unpacking
+        or instantiating this class. It has a slot for every key
+        returned by keys().
+
+        The keys which are converted lazily get a LazyAttribute in the
+        record class instead. Its value is cached in a slot prefixed with
+        _lazy_ and the unpacked values are kept in the _raw slot.
+        """
+
+        keys = tuple(cls.keys())
+        lazy_keys = cls._lazy_keys()
+
+        slots = [key for key in keys if key not in lazy_keys]
+
+        if lazy_keys:
+            slots.append('_raw')
+            slots.extend('_lazy_' + key for key in lazy_keys)
+
+        return type(cls)(cls.__name__, (cls, ), {
+            '__slots__': tuple(slots),
+            '__module__': cls.__module__,
+            '_is_record': True,
+            '_key_set': frozenset(keys),
+        })
+
+    def _collect_python_attributes(cls):
+        """
+        Returns the (key, source) tuples of the human-readable form: the
+        python_attribute_list, or the attributes in attribute_list when it
+        isn't defined, followed by the fields of every BitField.
+        """
+
+        python_attributes = []
+
+        if cls.python_attribute_list is not None:
+            python_attributes.extend(cls.python_attribute_list)
+
+        for attr, attr_cls in cls.attribute_list:
+            if isinstance(attr_cls, BitField):
+                python_attributes.extend(attr_cls.python_attributes(attr))
+            elif cls.python_attribute_list is None:
+                python_attributes.append((attr, attr))
+
+        return python_attributes
+
+    def _lazy_keys(cls):
+        """
+        The keys of the Computed python attributes, if this class is lazy.
+        """
+
+        if not cls.lazy or _is_overridden(cls, 'to_python'):
+            return ()
+
+        return tuple(
+            key for key, source in cls._python_attributes
+            if isinstance(source, Computed)
+        )
+
+    def _value_expressions(cls, ref):
+        """
+        Returns a dict with an expression for every attribute in
+        attribute_list. ref returns the expression for the n-th unpacked
+        value.
+        """
+
+        expressions = {}
+        n = 0
+
+        for attr, attr_cls in cls.attribute_list:
+            if isinstance(attr_cls, Array):
+                expressions[attr] = '[%s]' % ', '.join(
+                    ref(n + j) for j in range(attr_cls.size)
+                )
+                n += attr_cls.size
+            else:
+                expressions[attr] = ref(n)
+                n += 1
+
+        return expressions
+
+    def _python_expressions(cls, ref, namespace):
+        """
+        Returns a list of (key, expression) tuples for the python
+        attributes. The functions of Computed attributes are added to
+        namespace.
+        """
+
+        expressions = cls._value_expressions(ref)
+
+        items = []
+
+        for n, (key, source) in enumerate(cls._python_attributes):
+            if isinstance(source, Computed):
+                function_name = 'f%d' % n
+                namespace[function_name] = source.function
+
+                items.append((key, source.expression(
+                    function_name,
+                    [expressions[attr] for attr in source.attributes]
+                )))
+            else:
+                items.append((key, expressions[source]))
+
+        return items
+
+    def _compile_unpack(cls):
+        """
+        Generate the source of an unpack function specialized for the
+        attribute_list of this class and compile it.
+
+        The values returned by struct.unpack_from are assigned to local
+        variables, the dictionary which is handed to to_python is written
+        out as a literal and every key is assigned to its slot, so no loops
+        are executed when unpacking. The conversions declared in
+        python_attribute_list and the BitField members are written out
+        inline, or for lazy classes as one compute function per key.
+
+        Next to unpack a build function is returned which creates an
+        instance from the values at index base of an already unpacked
+        tuple, this is used by unpack_many.
+        """
+
+        record = cls._record_class
+        value_count = cls._value_count
+        values = ['v%d' % n for n in range(value_count)]
+
+        namespace = {
+            'unpack_from': cls.struct.unpack_from,
+            'to_python': cls.to_python,
+            'check_keys': record._check_keys,
+            'new': object.__new__,
+            'record': record,
+            'NOT_COMPUTED': NOT_COMPUTED,
+        }
+
+        lines = []
+
+        # Only call to_python if a subclass actually does a conversion,
+        # otherwise the values are stored in the slots directly.
+        if _is_overridden(cls, 'to_python'):
+            lines.append('    data = to_python({%s})' % ', '.join(
+                '%r: %s' % item
+                for item in cls._value_expressions(values.__getitem__).items()
+            ))
+            lines.append('    if len(data) != %d:' % len(record._key_set))
+            lines.append('        check_keys(data)')
+            items = [(key, 'data[%r]' % key) for key in cls.keys()]
+        else:
+            items = cls._python_expressions(values.__getitem__, namespace)
+
+        lazy_keys = cls._lazy_keys()
+
+        lines.append('    self = new(record)')
+
+        if lazy_keys:
+            lines.append('    self._raw = raw')
+
+        for key, value in items:
+            if key in lazy_keys:
+                lines.append('    self._lazy_%s = NOT_COMPUTED' % key)
+            else:
+                lines.append('    self.%s = %s' % (key, value))
+
+        lines.append('    return self')
+
+        unpack_lines = ['def unpack(buf, offset=0):']
+        build_lines = ['def build(values, base):']
+
+        if lazy_keys:
+            unpack_lines.append('    raw = unpack_from(buf, offset)')
+            build_lines.append('    raw = values[base:base + %d]' % value_count)
+
+            if values:
+                unpack_lines.append('    %s, = raw' % ', '.join(values))
+                build_lines.append('    %s, = raw' % ', '.join(values))
+        elif values:
+            unpack_lines.append('    %s, = unpack_from(buf, offset)' % ', '.join(values))
+            build_lines.append('    %s, = values[base:base + %d]' % (', '.join(values), value_count))
+
+        compute_lines = []
+
+        lazy_items = [
+            (key, value) for key, value in cls._python_expressions(
+                lambda n: 'raw[%d]' % n, namespace
+            ) if key in lazy_keys
+        ]
+
+        for key, value in lazy_items:
+            compute_lines.extend([
+                'def compute_%s(raw):' % key,
+                '    return %s' % value,
+            ])
+
+        source = '\n'.join(unpack_lines + lines + build_lines + lines + compute_lines)
+
+        code = compile(source, '<{0}.unpack>'.format(cls.__name__), 'exec')
+        exec(code, namespace)
+
+        for key in lazy_keys:
+            setattr(record, key, LazyAttribute(
+                getattr(record, '_lazy_' + key),
+                namespace['compute_' + key]
+            ))
+
+        return namespace['unpack'], namespace['build']
+
+
+def _is_overridden(cls, name):
+    """
+    Returns True if the classmethod name is overridden by a subclass of
+    Structure.
+    """
+
+    return getattr(cls, name).__func__ is not getattr(Structure, name).__func__
+
+
+# Stored in the cache slot of a LazyAttribute until it has been computed.
+NOT_COMPUTED = object()
+
+
+class LazyAttribute(object):
+    """
+    A descriptor which computes the value of a key from the unpacked
+    values on first access and caches it in a slot.
+    """
+
+    def __init__(self, slot, compute):
+        self.slot = slot
+        self.compute = compute
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+
+        value = self.slot.__get__(instance, owner)
+
+        if value is NOT_COMPUTED:
+            value = self.compute(instance._raw)
+            self.slot.__set__(instance, value)
+
+        return value
+
+    def __set__(self, instance, value):
+        self.slot.__set__(instance, value)
+
+    def __delete__(self, instance):
+        self.slot.__delete__(instance)
+
+
+class Computed(object):
+    """
+    A python attribute which is computed by calling function with the
+    unpacked values of attributes.
+    """
+
+    def __init__(self, function, *attributes):
+        self.function = function
+        self.attributes = attributes
+
+    def expression(self, function_name, arguments):
+        """
+        The source of an expression which computes the value, function_name
+        is the name function is bound to.
+        """
+
+        return '%s(%s)' % (function_name, ', '.join(arguments))
+
+
+class Masked(Computed):
+    """
+    The bits of an attribute which are set in mask.
+    """
+
+    def __init__(self, attribute, mask):
+        super(Masked, self).__init__(lambda value: value & mask, attribute)
+
+        self.mask = mask
+
+    def expression(self, function_name, arguments):
+        return '(%s & %d)' % (arguments[0], self.mask)
+
+
+class Flag(Computed):
+    """
+    True if all bits in mask are set in an attribute.
+    """
+
+    def __init__(self, attribute, mask):
+        super(Flag, self).__init__(lambda value: value & mask == mask, attribute)
+
+        self.mask = mask
+
+    def expression(self, function_name, arguments):
+        return '(%s & %d == %d)' % (arguments[0], self.mask, self.mask)
+
 
 class Endianness(object):
     pass
@@ -92,14 +402,17 @@ class Endianness(object):
 
 class LittleEndian(Endianness):
     format_char = '<'
+    dtype_char = '<'
 
 
 class BigEndian(Endianness):
     format_char = '>'
+    dtype_char = '>'
 
 
 class Native(Endianness):
     format_char = '='
+    dtype_char = '='
 
 
 class Structure(object):
@@ -107,12 +420,66 @@ class Structure(object):
 
     endianness = Native
 
+    # A tuple of (key, source) tuples describing the human-readable form.
+    # The source is either the name of an attribute in attribute_list or
+    # a Computed. When it is None the attributes are used as is. The
+    # fields of BitField attributes are always added.
+    python_attribute_list = None
+
+    # Lazy structures only convert Computed python attributes (including
+    # the fields of BitField attributes) when they are accessed for the
+    # first time.
+    lazy = False
+
+    def __new__(cls, *args, **kwargs):
+        return object.__new__(cls._record_class)
+
     def __init__(self, data):
         for key, value in data.iteritems():
             setattr(self, key, value)
 
-        # For backwards compat.
-        self.data = data
+    def __reduce__(self):
+        return (self._structure_class(), (dict(self.data), ))
+
+    @classmethod
+    def _structure_class(cls):
+        return cls.__mro__[1] if cls.__dict__.get('_is_record') else cls
+
+    @property
+    def data(self):
+        """
+        A dict-like view on the attributes of this instance. For backwards
+        compat.
+        """
+
+        return StructureData(self)
+
+    @classmethod
+    def keys(cls):
+        """
+        The keys for the human-readable form. Subclasses which override
+        to_python must return the keys of the dict it returns.
+        """
+
+        return [key for key, source in cls._python_attributes]
+
+    @classmethod
+    def _check_keys(cls, data):
+        """
+        Raise a TypeError if the keys of data, returned by to_python,
+        aren't the keys of this class.
+        """
+
+        keys = frozenset(data)
+
+        if keys != cls._key_set:
+            raise TypeError(
+                "{0}.to_python returned the keys {1}, expected {2}".format(
+                    cls._structure_class().__name__,
+                    sorted(keys),
+                    sorted(cls._key_set)
+                )
+            )
 
     @classmethod
     def from_python(cls, data):
@@ -129,7 +496,17 @@ class Structure(object):
         Convert from packed data form to a human readable form
         """
 
-        return data
+        new = {}
+
+        for key, source in cls._python_attributes:
+            if isinstance(source, Computed):
+                new[key] = source.function(
+                    *[data[attr] for attr in source.attributes]
+                )
+            else:
+                new[key] = data[source]
+
+        return new
 
     def pack(self, buf):
         pack_data = self.from_python(self.data)
@@ -139,31 +516,127 @@ class Structure(object):
             if isinstance(attr_cls, Array):
                 for j in range(0, attr_cls.size):
                     pack_args.append(pack_data[attr][j])
+            elif isinstance(attr_cls, BitField) and attr not in pack_data:
+                pack_args.append(attr_cls.combine(pack_data))
             else:
                 pack_args.append(pack_data[attr])
 
         return self.struct.pack_into(buf, 0, *pack_args)
 
     @classmethod
-    def unpack(cls, buf):
+    def unpack(cls, buf, offset=0):
+        """
+        Unpack the data at offset in buf into an instance of this class.
+        StructMetaClass replaces this with a function compiled for the
+        attribute_list of the class.
+        """
+
+        raise NotImplementedError()
+
+    @classmethod
+    def unpack_within(cls, buf, offset, end):
+        """
+        Like unpack, but raises struct.error if the instance doesn't end
+        before end, like unpacking a slice of buf which ends there would.
+        """
+
+        if offset + cls._struct_size > end:
+            raise struct.error(
+                "{0} requires {1} bytes".format(cls.__name__, cls._struct_size)
+            )
+
+        return cls.unpack(buf, offset)
+
+    @classmethod
+    def unpack_many(cls, buf, count, offset=0, columns=False):
+        """
+        Unpack count consecutive instances from buf, starting at offset,
+        with a single call to struct.unpack_from.
+
+        A list of instances is returned, or when columns is True a tuple
+        with a column of unpacked values for every value in the struct
+        format (an Array contributes one column per element).
+        """
+
+        raw = struct.unpack_from(
+            cls.endianness.format_char + cls._format_chars * count,
+            buf,
+            offset
+        )
+
+        n = cls._value_count
+
+        if columns:
+            return tuple(raw[i::n] for i in range(n))
+
+        build = cls._build
+
+        return [build(raw, base) for base in range(0, n * count, n)]
+
+    @classmethod
+    def iter_unpack(cls, buf, offset=0, end=None):
+        """
+        Iterate over the instances packed back to back in buf, starting at
+        offset, until no complete instance is left before end. The
+        instances are unpacked in blocks of at most ITER_UNPACK_COUNT
+        instances.
+        """
+
+        if end is None:
+            end = len(buf)
+
+        size = cls._struct_size
+        count = (end - offset) // size
+
+        while count > 0:
+            block_count = min(count, ITER_UNPACK_COUNT)
+
+            for instance in cls.unpack_many(buf, block_count, offset):
+                yield instance
+
+            offset += block_count * size
+            count -= block_count
+
+    @classmethod
+    def numpy_dtype(cls):
+        """
+        A NumPy structured dtype with the same layout as the struct of
+        this class.
+        """
 
-        raw_data = cls.struct.unpack_from(buf)
+        if numpy is None:
+            raise ImportError("numpy_dtype requires numpy")
+
+        fields = []
+
+        for attr, attr_cls in cls.attribute_list:
+            if isinstance(attr_cls, Array):
+                fields.append((
+                    attr,
+                    cls.endianness.dtype_char + attr_cls.cls.dtype_char,
+                    (attr_cls.size, )
+                ))
+            else:
+                fields.append((attr, cls.endianness.dtype_char + attr_cls.dtype_char))
 
-#       XXX: Replace this assertion with something sane.
-#        assert len(self.attribute_list) == len(raw_data)
+        return numpy.dtype(fields)
 
-        data = {}
+    @classmethod
+    def unpack_array(cls, buf, offsets):
+        """
+        Unpack an instance at every offset in buf into a NumPy structured
+        array with the dtype returned by numpy_dtype.
+        """
 
-        for attr, size in cls._initial_data_array:
-            data[attr] = []
+        dtype = cls.numpy_dtype()
 
-        for attr, array_idx, data_idx in cls._array_mapping:
-            data[attr].append(raw_data[data_idx])
+        data = numpy.frombuffer(buf, dtype=numpy.uint8)
+        offsets = numpy.asarray(offsets, dtype=numpy.intp)
 
-        for attr, data_idx in cls._field_mapping:
-            data[attr] = raw_data[data_idx]
+        # Gather the bytes of every instance into one row.
+        index = offsets[:, numpy.newaxis] + numpy.arange(dtype.itemsize)
 
-        return cls(cls.to_python(data))
+        return data[index].view(dtype).reshape(len(offsets))
 
     @classmethod
     def size(cls):
@@ -173,6 +646,63 @@ class Structure(object):
         abstract=True
 
 
+class StructureData(MutableMapping):
+    """
+    Presents the attributes of a Structure as a dict.
+    """
+
+    __slots__ = ('structure', )
+
+    def __init__(self, structure):
+        self.structure = structure
+
+    def __getitem__(self, key):
+        if key not in self.structure._key_set:
+            raise KeyError(key)
+
+        try:
+            return getattr(self.structure, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        if key not in self.structure._key_set:
+            return False
+
+        try:
+            getattr(self.structure, key)
+        except AttributeError:
+            return False
+
+        return True
+
+    def __setitem__(self, key, value):
+        if key not in self.structure._key_set:
+            raise KeyError(key)
+
+        setattr(self.structure, key, value)
+
+    def __delitem__(self, key):
+        if key not in self.structure._key_set:
+            raise KeyError(key)
+
+        try:
+            delattr(self.structure, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __iter__(self):
+        for key in self.structure.keys():
+            if key in self:
+                yield key
+
+    def __len__(self):
+        return sum(1 for key in self)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
 class DataType(object):
     pass
 
@@ -190,28 +720,93 @@ class Array(object):
 
 class UInt64(DataType):
     format_char = 'Q'
+    dtype_char = 'u8'
 
 
 class UInt32(DataType):
     format_char = 'I'
+    dtype_char = 'u4'
 
 
 class UInt16(DataType):
     format_char = 'H'
+    dtype_char = 'u2'
 
 
 class UInt8(DataType):
     format_char = 'B'
+    dtype_char = 'u1'
 
 
 class Int8(DataType):
     format_char = 'b'
+    dtype_char = 'i1'
 
 
 class Int16(DataType):
     format_char = 'h'
+    dtype_char = 'i2'
 
 
 class Int32(DataType):
     format_char = 'i'
+    dtype_char = 'i4'
+
+
+class Int64(DataType):
+    format_char = 'q'
+    dtype_char = 'i8'
+
+
+class BitField(object):
+    """
+    An integer attribute which consists of several fields. fields is a
+    tuple of (key, mask) tuples, every key is a python attribute with the
+    bits of the integer which are set in mask (without shifting them).
+    """
+
+    python_attribute_cls = Masked
+
+    def __init__(self, cls, fields):
+        self.cls = cls
+        self.fields = fields
+
+        self.format_char = cls.format_char
+        self.dtype_char = cls.dtype_char
+
+    def python_attributes(self, attr):
+        return [
+            (key, self.python_attribute_cls(attr, mask))
+            for key, mask in self.fields
+        ]
+
+    def combine(self, data):
+        """
+        Combine the fields in data into the integer.
+        """
+
+        value = 0
+
+        for key, mask in self.fields:
+            value |= data[key] & mask
+
+        return value
+
+
+class Flags(BitField):
+    """
+    An integer attribute which consists of flags. fields is a tuple of
+    (key, mask) tuples, every key is a python attribute which is True if
+    the bits in mask are set.
+    """
+
+    python_attribute_cls = Flag
+
+    def combine(self, data):
+        value = 0
+
+        for key, mask in self.fields:
+            if data[key]:
+                value |= mask
 
+        return value
@@ -14,6 +14,7 @@
 # OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
 #
 
+import struct
 import sys
 
 def dump_array(a, name = None):
@@ -28,6 +29,36 @@ def dump_array(a, name = None):
 
     sys.stdout.write('\n')
 
+try:
+    _buffer = buffer
+except NameError:
+    _buffer = None
+
+def buffer_slice(buf, offset, length):
+    """
+    Returns a view on length bytes of buf, starting at offset, without
+    copying them.
+    """
+
+    if _buffer is not None:
+        return _buffer(buf, offset, length)
+
+    return memoryview(buf)[offset:offset + length]
+
+def unpack_bytes(buf, offset, length):
+    """
+    Returns length bytes of buf, starting at offset, as a string.
+    """
+
+    return struct.unpack_from('%ds' % length, buf, offset)[0]
+
+def unpack_octets(buf, offset, length):
+    """
+    Returns length bytes of buf, starting at offset, as a tuple of integers.
+    """
+
+    return struct.unpack_from('%dB' % length, buf, offset)
+
 def field_is_set(data, mask):
     return data & mask == mask
 
@@ -9,6 +9,10 @@ setup(
     description=('A PCAP parser with support for Radiotap and IEEE 802.11 frames'),
     license='ISC',
     packages=find_packages(exclude=['run_tests.sh', ]),
+    extras_require={
+        'numpy': ['numpy'],
+        'xz': ['backports.lzma'],
+    },
 
     classifiers=[
         'Development Status :: 3 - Alpha',